@@ -2,7 +2,7 @@
 {
     "name": "Estate Rent Management",
     "summary": "Buildings, units, rent contracts, and GL tagging (Odoo 18)",
-    "version": "18.0.1.0.0",
+    "version": "18.0.1.9.0",
     "author": "Mustafa Thaeer",
     "website": "https://github.com/mustafa327",
     "support": "mustafathaear97@gmail.com",
@@ -29,6 +29,15 @@
         "views/estate_menus.xml",
         "views/rent_prepayment_view.xml",
         "views/utility_views.xml",
+        "views/owner_transfer_views.xml",
+        "views/utility_import_views.xml",
+        "views/utility_report_views.xml",
+        "views/owner_statement_views.xml",
+        "report/owner_statement_report.xml",
+        "views/rent_roll_report_views.xml",
+        "views/rent_cron_run_views.xml",
+        "views/rent_forecast_views.xml",
+        "views/rent_contract_schedule_views.xml",
         "data/rent_cron.xml",
     ],
     
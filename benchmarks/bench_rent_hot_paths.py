@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Time and count the queries of the rent hot paths on a seeded synthetic portfolio.
+
+    odoo-bin shell -d <scratch db> --no-http < benchmarks/bench_rent_hot_paths.py
+
+The portfolio (``seed_portfolio.SCALES``) is seeded inside a savepoint and everything is rolled
+back at the end, the crons' per-batch commits included. Every operation runs twice, on a small
+sample and on a sample GROWTH times bigger: set-based code issues about the same number of
+queries for both, per-record code about GROWTH times more. An AssertionError lists the
+operations whose query count grew more than their budget allows.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import fields
+from odoo.addons.estate_rent_mgmt.benchmarks.seed_portfolio import SCALES, seed
+
+SAMPLE = 20
+GROWTH = 10
+
+# max allowed query-count ratio (large sample / small sample); per-record code scores ~GROWTH
+BUDGETS = {
+    'cron_consume_prepayments_daily': 3.0,
+    'cron_create_rent_due_activities': 2.0,
+    'estate.building.unit._compute_expected_revenue': 2.0,
+    'estate.building._compute_expected_revenue': 2.0,
+    'rent.prepayment._compute_consumed': 2.0,
+    'counters': 2.0,
+    'rent.utility.wizard.action_add_to_invoice': 3.0,
+}
+
+# extra queries allowed for the GROWTH times bigger sample (tests/test_rent_hot_paths.py): batch
+# bookkeeping only, far below the (GROWTH - 1) * sample queries of one query per record
+MARGINS = {
+    'cron_consume_prepayments_daily': 15,
+    'cron_create_rent_due_activities': 10,
+    'estate.building.unit._compute_expected_revenue': 3,
+    'estate.building._compute_expected_revenue': 3,
+    'rent.prepayment._compute_consumed': 3,
+    'counters': 3,
+    'rent.utility.wizard.action_add_to_invoice': 10,
+}
+
+
+@contextmanager
+def _measure(env, results, label, size):
+    env.flush_all()
+    env.invalidate_all()
+    queries = env.cr.sql_log_count
+    wall, cpu = time.perf_counter(), time.process_time()
+    yield
+    env.flush_all()
+    results.append({
+        'label': label,
+        'size': size,
+        'queries': env.cr.sql_log_count - queries,
+        'wall': time.perf_counter() - wall,
+        'cpu': time.process_time() - cpu,
+    })
+
+
+class _Slices:
+    """Hands out disjoint slices of a recordset, so that no run sees the side effects of another."""
+
+    def __init__(self, records):
+        self.records = records
+        self.offset = 0
+
+    def take(self, size, predicate=None):
+        """The next ``size`` records (matching ``predicate``, the others are skipped for good)."""
+        chunk = self.records.browse()
+        while len(chunk) < size and self.offset < len(self.records):
+            record = self.records[self.offset]
+            self.offset += 1
+            if predicate is None or predicate(record):
+                chunk |= record
+        assert len(chunk) == size, "portfolio too small for the benchmark samples"
+        return chunk
+
+
+def _make_due(env, contracts, today):
+    """Only ``contracts`` are due today; the rest of the portfolio is parked next month."""
+    Contract = env['rent.contract']
+    Contract.search([('next_due_date', '<=', today)]).write({'next_due_date': today + relativedelta(months=1)})
+    contracts.write({'next_due_date': today})
+
+
+def _operations(env, data, today, sample=SAMPLE):
+    """(label, prepare) of the measured operations; ``prepare(size)`` returns (operation, actual size)."""
+    contracts = _Slices(data['contracts'])
+    units = _Slices(data['units'])
+    buildings = _Slices(data['buildings'])
+    prepayments = _Slices(data['prepayments'])
+
+    def billing(size):
+        _make_due(env, contracts.take(size), today)
+        return (lambda: env['rent.contract'].cron_consume_prepayments_daily()), size
+
+    def reminders(size):
+        _make_due(env, contracts.take(size), today)
+        return (lambda: env['rent.contract'].cron_create_rent_due_activities()), size
+
+    def unit_revenue(size):
+        recs = units.take(size)
+        return recs._compute_expected_revenue, size
+
+    def building_revenue(size):
+        # read-only: the same buildings can be reused
+        recs = data['buildings'][:max(size // sample, 1)]
+        return recs._compute_expected_revenue, len(recs)
+
+    def consumed(size):
+        recs = prepayments.take(size)
+        return recs._compute_consumed, size
+
+    def counters(size):
+        recs = contracts.take(size)
+
+        def run():
+            recs.mapped('invoice_count')
+            recs.unit_id.mapped('contract_count')
+            recs.building_id.mapped('contract_count')
+            recs.building_id.mapped('unit_count')
+        return run, size
+
+    def wizard(size):
+        # building mode on a fresh building holding exactly ``size`` active contracts, whatever
+        # the number of units per building of the seeded portfolio
+        building = buildings.take(1)
+        data['contracts'].filtered(lambda c: c.building_id == building).write({'state': 'draft'})
+        recs = contracts.take(size, lambda c: c.state == 'active' and c.building_id != building)
+        recs.unit_id.write({'building_id': building.id})
+        recs.write({'building_id': building.id})
+        utility_type = data['utility_types'][0]
+
+        def run():
+            wiz = env['rent.utility.wizard'].create({
+                'building_id': building.id,
+                'period_start': today.replace(day=1),
+                'period_end': today,
+                'line_ids': [fields.Command.create({
+                    'type_id': utility_type.id,
+                    'unit_rate': utility_type.unit_rate,
+                    'amount': 10.0,
+                })],
+            })
+            wiz.action_add_to_invoice()
+        return run, size
+
+    return [
+        ('cron_consume_prepayments_daily', billing),
+        ('cron_create_rent_due_activities', reminders),
+        ('estate.building.unit._compute_expected_revenue', unit_revenue),
+        ('estate.building._compute_expected_revenue', building_revenue),
+        ('rent.prepayment._compute_consumed', consumed),
+        ('counters', counters),
+        ('rent.utility.wizard.action_add_to_invoice', wizard),
+    ]
+
+
+def run(env, scale='small', sample=SAMPLE, growth=GROWTH, budgets=None):
+    budgets = dict(BUDGETS, **(budgets or {}))
+    today = fields.Date.context_today(env['rent.contract'])
+    thread = threading.current_thread()
+    was_testing = getattr(thread, 'testing', False)
+    results = []
+    # _cron_auto_commit() is off in "testing" threads: the whole benchmark stays in the savepoint
+    thread.testing = True
+    try:
+        with env.cr.savepoint(flush=False) as savepoint:
+            ICP = env['ir.config_parameter'].sudo()
+            ICP.set_param('estate_rent_mgmt.cron_shard_count', 1)
+            ICP.set_param('estate_rent_mgmt.cron_batch_size', sample * growth)
+
+            started = time.perf_counter()
+            data = seed(env, **SCALES[scale])
+            print("seeded %s portfolio in %.1fs" % (scale, time.perf_counter() - started))
+
+            for label, prepare in _operations(env, data, today, sample):
+                for size in (sample, sample * growth):
+                    operation, size = prepare(size)
+                    with _measure(env, results, label, size):
+                        operation()
+            savepoint.rollback()
+    finally:
+        thread.testing = was_testing
+        env.cr.rollback()
+
+    print("%-50s %6s %8s %9s %9s" % ('operation', 'size', 'queries', 'wall (s)', 'cpu (s)'))
+    for res in results:
+        print("%-50s %6d %8d %9.3f %9.3f" % (res['label'], res['size'], res['queries'], res['wall'], res['cpu']))
+
+    failures = []
+    for small, large in zip(results[::2], results[1::2]):
+        ratio = large['queries'] / max(small['queries'], 1)
+        if ratio > budgets[small['label']]:
+            failures.append("%s: %d -> %d queries for %d -> %d records (budget %.1fx)" % (
+                small['label'], small['queries'], large['queries'], small['size'], large['size'],
+                budgets[small['label']]))
+    if failures:
+        raise AssertionError("per-record queries reintroduced:\n" + "\n".join(failures))
+    return results
+
+
+if 'env' in globals():
+    run(env)  # noqa: F821 (provided by odoo-bin shell)
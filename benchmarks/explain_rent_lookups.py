@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""EXPLAIN the rent lookup paths with and without the module's indexes.
+
+Run it in an Odoo shell on a copy of production data:
+
+    odoo-bin shell -d <db> --no-http < benchmarks/explain_rent_lookups.py
+
+For every lookup the plan is printed twice: "before" runs inside a savepoint where the
+module's indexes are dropped (rolled back afterwards), "after" runs with the indexes in place.
+Nothing is committed.
+"""
+from odoo import fields
+from odoo.tools import SQL
+from odoo.tools.sql import make_index_name
+
+# sparse x_* columns indexed with index='btree_not_null'
+FIELD_INDEXES = {
+    'account_move': ['x_building_id', 'x_unit_id', 'x_owner_id', 'contract_id'],
+    'account_move_line': ['x_building_id', 'x_unit_id', 'x_owner_id'],
+}
+
+
+def _module_indexes(env):
+    names = ['account_move_rent_billing_period_uniq']
+    for model_name in ('rent.contract', 'account.move', 'account.move.line'):
+        names += [name for name, _expressions, _where in env[model_name]._rent_indexes]
+    for table, columns in FIELD_INDEXES.items():
+        names += [make_index_name(table, column) for column in columns]
+    return names
+
+
+def _lookups(env):
+    """(label, model, domain, order) of the hot lookups, built from a real active contract."""
+    today = fields.Date.context_today(env['rent.contract'])
+    contract = env['rent.contract'].search([('state', '=', 'active')], limit=1)
+    lookups = [
+        ('due contracts (crons)', 'rent.contract',
+         env['rent.contract']._get_due_contracts_domain(today), 'next_due_date, id'),
+        ('contracts to expire (lifecycle)', 'rent.contract',
+         [('state', '=', 'active'), ('end_date', '!=', False), ('end_date', '<', today)], None),
+    ]
+    if contract:
+        invoice_domain = [
+            ('move_type', '=', 'out_invoice'),
+            ('partner_id', '=', contract.partner_id.id),
+            ('x_building_id', '=', contract.building_id.id),
+            ('x_unit_id', '=', contract.unit_id.id),
+        ]
+        lookups += [
+            ('month invoice (_find_month_invoices)', 'account.move', [
+                ('contract_id', 'in', contract.ids),
+                ('billing_period', '=', contract._get_billing_period(today)),
+                ('rent_kind', '=', 'rent'),
+                ('state', '!=', 'cancel'),
+            ], None),
+            ('contract invoices (counter / button)', 'account.move', invoice_domain, None),
+        ]
+        if contract.owner_id:
+            lookups.append(('owner journal items', 'account.move.line',
+                            [('x_owner_id', '=', contract.owner_id.id),
+                             ('x_building_id', '=', contract.building_id.id)], None))
+    return lookups
+
+
+def _explain(env, model_name, domain, order):
+    query = env[model_name]._search(domain, order=order, limit=1 if order else None)
+    env.cr.execute(SQL("EXPLAIN (ANALYZE, BUFFERS) %s", query.select()))
+    return "\n".join(row[0] for row in env.cr.fetchall())
+
+
+def run(env):
+    lookups = _lookups(env)
+    env.flush_all()
+    plans = {}
+    with env.cr.savepoint(flush=False) as savepoint:
+        for name in _module_indexes(env):
+            env.cr.execute(SQL("DROP INDEX IF EXISTS %s", SQL.identifier(name)))
+        for label, model_name, domain, order in lookups:
+            plans[label] = [_explain(env, model_name, domain, order)]
+        savepoint.rollback()
+    for label, model_name, domain, order in lookups:
+        plans[label].append(_explain(env, model_name, domain, order))
+
+    for label, (before, after) in plans.items():
+        print("=" * 80)
+        print(label)
+        print("-" * 30, "before", "-" * 30)
+        print(before)
+        print("-" * 30, "after", "-" * 31)
+        print(after)
+    env.cr.rollback()
+    return plans
+
+
+if 'env' in globals():
+    run(env)  # noqa: F821 (provided by odoo-bin shell)
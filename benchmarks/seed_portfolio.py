@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Seeded synthetic portfolio for the rent benchmarks.
+
+    odoo-bin shell -d <scratch db> --no-http < benchmarks/seed_portfolio.py
+
+builds the 'small' portfolio of SCALES and commits it; ``bench_rent_hot_paths.py`` calls
+``seed()`` itself inside a savepoint instead. The same seed always produces the same portfolio.
+"""
+import random
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import fields
+
+# buildings / units / contracts / prepayments (total); consumptions and utility expenses per contract
+SCALES = {
+    'small': dict(buildings=10, units=1000, prepayments=12000, consumptions=6, expenses=6),
+    'medium': dict(buildings=50, units=5000, prepayments=60000, consumptions=6, expenses=12),
+    'large': dict(buildings=100, units=10000, prepayments=120000, consumptions=6, expenses=12),
+}
+
+CHUNK = 5000
+
+
+def _create(env, model_name, vals_list):
+    """create() in chunks without mail tracking; returns the ids in creation order."""
+    Model = env[model_name].with_context(tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
+    ids = []
+    for start in range(0, len(vals_list), CHUNK):
+        ids += Model.create(vals_list[start:start + CHUNK]).ids
+    return env[model_name].browse(ids)
+
+
+def seed(env, buildings=100, units=10000, prepayments=120000, consumptions=6, expenses=12, seed_value=42):
+    """Create a portfolio of ``units`` occupied units spread over ``buildings`` buildings, one active
+    monthly contract per unit, ``prepayments`` prepayments spread over the contracts, and per contract
+    ``consumptions`` prepayment consumptions and ``expenses`` metered utility expenses.
+
+    :return: dict of the created recordsets (buildings, units, contracts, prepayments, ...)
+    """
+    rnd = random.Random(seed_value)
+    today = fields.Date.context_today(env['rent.contract'])
+    company = env.company
+
+    owners = _create(env, 'res.partner', [
+        {'name': 'Bench Owner %s' % i, 'is_property_owner': True} for i in range(max(buildings // 5, 1))
+    ])
+    building_recs = _create(env, 'estate.building', [{
+        'name': 'Bench Building %s' % i,
+        'code': 'BB%05d' % i,
+        'company_id': company.id,
+        'owner_id': owners[i % len(owners)].id,
+    } for i in range(buildings)])
+    unit_recs = _create(env, 'estate.building.unit', [{
+        'name': 'Unit %s' % i,
+        'unit_number': str(i),
+        'floor': i % 20,
+        'building_id': building_recs[i % buildings].id,
+    } for i in range(units)])
+    tenants = _create(env, 'res.partner', [{'name': 'Bench Tenant %s' % i} for i in range(units)])
+
+    contract_recs = _create(env, 'rent.contract', [{
+        'partner_id': tenants[i].id,
+        'building_id': unit.building_id.id,
+        'unit_id': unit.id,
+        'company_id': company.id,
+        'amount': rnd.choice((250, 400, 600, 900, 1500)),
+        'recurrence': 'month',
+        'rent_due_day': rnd.randint(1, 28),
+        'start_date': today - relativedelta(months=rnd.randint(1, 36)),
+        'end_date': today + relativedelta(months=rnd.randint(1, 24)),
+        'state': 'active',
+    } for i, unit in enumerate(unit_recs)])
+
+    prepayment_recs = _create(env, 'rent.prepayment', [{
+        'contract_id': contract_recs[i % units].id,
+        'date': today - timedelta(days=rnd.randint(30, 900)),
+        'months': 1,
+        'amount': contract_recs[i % units].amount,
+    } for i in range(prepayments)])
+
+    # consumptions need an invoice; one historical draft per building keeps seeding cheap
+    history_moves = _create(env, 'account.move', [{
+        'move_type': 'out_invoice',
+        'partner_id': owners[0].id,
+        'x_building_id': b.id,
+    } for b in building_recs])
+    move_by_building = dict(zip(building_recs.ids, history_moves))
+    per_contract = {}
+    for prepay in prepayment_recs:
+        per_contract.setdefault(prepay.contract_id.id, []).append(prepay)
+    consumption_vals = []
+    for contract in contract_recs:
+        for prepay in per_contract.get(contract.id, [])[:consumptions]:
+            consumption_vals.append({
+                'contract_id': contract.id,
+                'invoice_id': move_by_building[contract.building_id.id].id,
+                'prepayment_id': prepay.id,
+                'amount': round(prepay.amount * rnd.choice((0.25, 0.5, 1.0)), 2),
+            })
+    consumption_recs = _create(env, 'rent.prepayment.consumption', consumption_vals)
+
+    utility_types = _create(env, 'rent.utility.type', [{
+        'name': 'Bench %s' % name,
+        'product_id': env['product.product'].create({'name': 'Bench %s' % name, 'type': 'service'}).id,
+        'pricing': 'meter',
+        'unit_rate': rate,
+    } for name, rate in (('Electricity', 0.12), ('Water', 0.8))])
+    expense_vals = []
+    for contract in contract_recs:
+        for utype in utility_types:
+            reading = 0.0
+            for month in range(expenses, 0, -1):
+                start = today - relativedelta(months=month)
+                used = rnd.uniform(50, 400)
+                expense_vals.append({
+                    'contract_id': contract.id,
+                    'type_id': utype.id,
+                    'period_start': start,
+                    'period_end': start + relativedelta(months=1, days=-1),
+                    'reading_start': reading,
+                    'reading_end': reading + used,
+                    'unit_rate': utype.unit_rate,
+                    'amount': round(used * utype.unit_rate, 2),
+                })
+                reading += used
+    expense_recs = _create(env, 'rent.utility.expense', expense_vals)
+
+    env.flush_all()
+    return {
+        'owners': owners,
+        'buildings': building_recs,
+        'units': unit_recs,
+        'contracts': contract_recs,
+        'prepayments': prepayment_recs,
+        'consumptions': consumption_recs,
+        'utility_types': utility_types,
+        'expenses': expense_recs,
+    }
+
+
+if 'env' in globals():
+    seed(env, **SCALES['small'])  # noqa: F821 (provided by odoo-bin shell)
+    env.cr.commit()  # noqa: F821
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from odoo import _, http
+from odoo.exceptions import AccessError
+from odoo.http import request
+
+
+class RentForecastController(http.Controller):
+
+    @http.route('/estate_rent_mgmt/forecast', type='json', auth='user')
+    def rent_forecast(self, months=None, company_id=None):
+        """Projected rent income per building, owner and month for one of the user's companies."""
+        company = request.env.company
+        if company_id:
+            company = request.env['res.company'].browse(int(company_id))
+            if company not in request.env.user.company_ids:
+                raise AccessError(_("You do not have access to this company."))
+        return {
+            'company_id': company.id,
+            'currency': company.currency_id.name,
+            'lines': request.env['rent.forecast.line']._get_forecast_data(company, months),
+        }
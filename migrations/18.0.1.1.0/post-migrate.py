@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Fill the new incrementally maintained rent.contract.prepayment_balance."""
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['rent.contract'].browse()._recompute_prepayment_balance()
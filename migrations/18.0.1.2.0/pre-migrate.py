@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """unique(unit_id, state) also allowed a single expired/cancelled contract per unit, which breaks
+    the daily lifecycle job; it is replaced by a partial unique index on active contracts (see init())."""
+    if not version:
+        return
+    cr.execute("ALTER TABLE rent_contract DROP CONSTRAINT IF EXISTS rent_contract_contract_unique_active")
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Stamp existing rent invoices with (contract_id, billing_period, rent_kind).
+
+    Only unambiguous matches are stamped: the (tenant, building, unit) triple of the invoice must
+    belong to exactly one contract, and only the newest live invoice of each (contract, month) gets
+    the period key (the one the former date-range lookup returned)."""
+    if not version:
+        return
+    cr.execute("""
+        UPDATE account_move m
+           SET contract_id = p.contract_id, rent_kind = 'prepayment'
+          FROM rent_prepayment p
+         WHERE p.move_id = m.id
+           AND m.contract_id IS NULL
+    """)
+    cr.execute("""
+        WITH matches AS (
+            SELECT m.id AS move_id,
+                   MIN(c.id) AS contract_id,
+                   date_trunc('month', m.invoice_date)::date AS period
+              FROM account_move m
+              JOIN rent_contract c
+                ON c.partner_id = m.partner_id
+               AND c.building_id = m.x_building_id
+               AND c.unit_id = m.x_unit_id
+             WHERE m.move_type = 'out_invoice'
+               AND m.contract_id IS NULL
+               AND m.invoice_date IS NOT NULL
+               AND m.state != 'cancel'
+             GROUP BY m.id
+            HAVING COUNT(c.id) = 1
+        ), latest AS (
+            SELECT DISTINCT ON (contract_id, period) move_id, contract_id, period
+              FROM matches
+             ORDER BY contract_id, period, move_id DESC
+        )
+        UPDATE account_move m
+           SET contract_id = l.contract_id, billing_period = l.period, rent_kind = 'rent'
+          FROM latest l
+         WHERE m.id = l.move_id
+    """)
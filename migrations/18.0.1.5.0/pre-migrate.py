@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Create and fill account_move.is_rent_prepayment in SQL, so the upgrade does not
+    recompute the new stored field in Python for every journal entry."""
+    if not version:
+        return
+    cr.execute("ALTER TABLE account_move ADD COLUMN IF NOT EXISTS is_rent_prepayment boolean")
+    cr.execute("""
+        UPDATE account_move
+           SET is_rent_prepayment = true
+         WHERE id IN (SELECT move_id FROM rent_prepayment WHERE move_id IS NOT NULL)
+    """)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Multi-currency figures: consumptions are now in the contract currency, and advances or
+    contracts in a foreign currency are converted instead of added as raw numbers. Only the
+    records actually involving a foreign currency are recomputed."""
+    if not version:
+        return
+    cr.execute("""
+        UPDATE rent_prepayment_consumption k
+           SET currency_id = c.currency_id
+          FROM rent_contract c
+         WHERE c.id = k.contract_id
+           AND k.currency_id IS DISTINCT FROM c.currency_id
+    """)
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Contract = env['rent.contract']
+    Prepayment = env['rent.prepayment']
+    Unit = env['estate.building.unit']
+
+    cr.execute("""
+        SELECT p.id, p.contract_id
+          FROM rent_prepayment p
+          JOIN rent_contract c ON c.id = p.contract_id
+         WHERE p.currency_id != c.currency_id
+    """)
+    rows = cr.fetchall()
+    if rows:
+        prepayments = Prepayment.browse([row[0] for row in rows])
+        for fname in ('amount_consumed', 'balance'):
+            env.add_to_compute(Prepayment._fields[fname], prepayments)
+        Contract.browse(list({row[1] for row in rows}))._recompute_prepayment_balance()
+
+    cr.execute("""
+        SELECT DISTINCT c.unit_id
+          FROM rent_contract c
+          JOIN res_company rc ON rc.id = c.company_id
+         WHERE c.state = 'active'
+           AND c.currency_id != rc.currency_id
+    """)
+    units = Unit.browse([row[0] for row in cr.fetchall()])
+    if units:
+        units._refresh_date_boundaries()
+    env.flush_all()
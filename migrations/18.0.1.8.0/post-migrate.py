@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Reminders are now stamped on last_reminder_date (last_due_activity_date is the billing stamp):
+    start from the former shared stamp so contracts reminded before the upgrade are not reminded again."""
+    if not version:
+        return
+    cr.execute("""
+        UPDATE rent_contract
+           SET last_reminder_date = last_due_activity_date
+         WHERE last_due_activity_date IS NOT NULL
+           AND last_reminder_date IS NULL
+    """)
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Owner statement runs now resume after last_owner_id (owners in id order) instead of an index
+    into the owner list: seed it from the statements already generated by the unfinished runs."""
+    if not version:
+        return
+    cr.execute("""
+        UPDATE rent_owner_statement_run run
+           SET last_owner_id = done.owner_id
+          FROM (SELECT run_id, MAX(owner_id) AS owner_id
+                  FROM rent_owner_statement
+                 GROUP BY run_id) done
+         WHERE done.run_id = run.id
+           AND run.state IN ('queued', 'failed')
+    """)
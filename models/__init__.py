@@ -6,4 +6,15 @@ from . import inherit_sale_order
 from . import inherit_account_move
 from . import rent_prepayment
 from . import utility_wizard
-from . import utility
\ No newline at end of file
+from . import utility
+from . import rent_cron_shard
+from . import owner_transfer_wizard
+from . import utility_import
+from . import utility_report
+from . import owner_statement
+from . import rent_cron_run
+from . import rent_forecast
+from . import rent_contract_schedule
+# after the schedule: the report view reads its table
+from . import rent_roll_report
+from . import inherit_currency
\ No newline at end of file
@@ -1,85 +1,168 @@
-from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
-
-class EstateBuildingUnit(models.Model):
-    _name = 'estate.building.unit'
-    _description = 'Building Unit (Apartment)'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
-
-    name = fields.Char(string='اسم الشقة/الوحدة', required=True, tracking=True)
-    building_id = fields.Many2one('estate.building', string='البناية', required=True, ondelete='cascade', tracking=True)
-    owner_id = fields.Many2one('res.partner', string="Owner (Unit) / مالك الوحدة", domain=[('is_property_owner', '=', True)], help="If empty, we fallback to the building owner.")
-    floor = fields.Integer(string='رقم الطابق', tracking=True)
-    unit_number = fields.Char(string='رقم الشقة', tracking=True)
-
-    department_id = fields.Many2one('hr.department', string='القسم (اختياري)')
-
-    tenant_id = fields.Many2one('res.partner', string='المستأجر الحالي')
-    contract_ids = fields.One2many('rent.contract', 'unit_id', string='عقود الإيجار')
-
-    active_contract_id = fields.Many2one('rent.contract', string='العقد الفعّال', compute='_compute_active_contract', store=False)
-    occupied = fields.Boolean(string='مشغولة؟', compute='_compute_active_contract', store=False)
-
-    contract_count = fields.Integer(string='Contracts', compute='_compute_contract_count', store=False)
-
-    @api.depends('contract_ids.state', 'contract_ids.start_date', 'contract_ids.end_date')
-    def _compute_active_contract(self):
-        today = fields.Date.context_today(self)
-        for u in self:
-            active = u.contract_ids.filtered(lambda c: c.state == 'active' and (not c.end_date or c.end_date >= today) and (not c.start_date or c.start_date <= today))
-            u.active_contract_id = active[:1].id if active else False
-            u.occupied = bool(active)
-
-    @api.depends('owner_id', 'building_id.owner_id')
-    def _compute_effective_owner_id(self):
-        for rec in self:
-            rec.effective_owner_id = rec.owner_id or rec.building_id.owner_id
-
-    effective_owner_id = fields.Many2one(
-        'res.partner', compute=_compute_effective_owner_id, store=True,
-        string="Effective Owner / المالك الفعلي"
-    )
-
-    def action_new_contract(self):
-        self.ensure_one()
-        return {
-            'type': 'ir.actions.act_window',
-            'name': _('New Contract'),
-            'res_model': 'rent.contract',
-            'view_mode': 'form',
-            'target': 'current',
-            'context': {
-                'default_unit_id': self.id,
-                'default_building_id': self.building_id.id,
-                'default_partner_id': self.tenant_id.id or False,
-                'default_company_id': (self.building_id.company_id.id or self.env.company.id),
-            },
-        }
-
-    def _compute_contract_count(self):
-        for u in self:
-            u.contract_count = len(u.contract_ids)
-
-    def action_open_contracts(self):
-        self.ensure_one()
-        return {
-            'type': 'ir.actions.act_window',
-            'name': _('Contracts'),
-            'res_model': 'rent.contract',
-            'view_mode': 'list,form',
-            'domain': [('unit_id', '=', self.id)],
-            'target': 'current',
-        }
-
-    def action_open_active_contract(self):
-        self.ensure_one()
-        if self.active_contract_id:
-            return {
-                'type': 'ir.actions.act_window',
-                'name': _('Active Contract'),
-                'res_model': 'rent.contract',
-                'view_mode': 'form',
-                'res_id': self.active_contract_id.id,
-                'target': 'current',
-            }
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+class EstateBuildingUnit(models.Model):
+    _name = 'estate.building.unit'
+    _description = 'Building Unit (Apartment)'
+    _inherit = ['mail.thread', 'mail.activity.mixin']
+
+    name = fields.Char(string='اسم الشقة/الوحدة', required=True, tracking=True)
+    building_id = fields.Many2one('estate.building', string='البناية', required=True, ondelete='cascade', tracking=True)
+    owner_id = fields.Many2one('res.partner', string="Owner (Unit) / مالك الوحدة", domain=[('is_property_owner', '=', True)], help="If empty, we fallback to the building owner.")
+    floor = fields.Integer(string='رقم الطابق', tracking=True)
+    unit_number = fields.Char(string='رقم الشقة', tracking=True)
+
+    department_id = fields.Many2one('hr.department', string='القسم (اختياري)')
+
+    tenant_id = fields.Many2one('res.partner', string='المستأجر الحالي')
+    contract_ids = fields.One2many('rent.contract', 'unit_id', string='عقود الإيجار')
+
+    active_contract_id = fields.Many2one('rent.contract', string='العقد الفعّال', compute='_compute_active_contract', store=True, index=True)
+    occupied = fields.Boolean(string='مشغولة؟', compute='_compute_active_contract', store=True, index=True)
+
+    contract_count = fields.Integer(string='Contracts', compute='_compute_contract_count', store=False)
+
+    currency_id = fields.Many2one(related='building_id.currency_id', readonly=True)
+    revenue_monthly_expected = fields.Monetary(string='إيراد شهري متوقع',
+                                               compute='_compute_expected_revenue', store=True)
+    revenue_yearly_expected = fields.Monetary(string='إيراد سنوي متوقع',
+                                              compute='_compute_expected_revenue', store=True)
+
+    @api.depends('contract_ids.state', 'contract_ids.start_date', 'contract_ids.end_date')
+    def _compute_active_contract(self):
+        today = fields.Date.context_today(self)
+        for u in self:
+            active = u.contract_ids.filtered(lambda c: c.state == 'active' and (not c.end_date or c.end_date >= today) and (not c.start_date or c.start_date <= today))
+            u.active_contract_id = active[:1].id if active else False
+            u.occupied = bool(active)
+
+    @api.depends(
+        'contract_ids.state',
+        'contract_ids.amount',
+        'contract_ids.currency_id',
+        'contract_ids.recurrence',
+        'contract_ids.start_date',
+        'contract_ids.end_date',
+    )
+    def _compute_expected_revenue(self):
+        """Compute expected monthly/yearly revenue from ACTIVE contracts only.
+        Always assign values for every record (even if zero).
+        Contract amounts are converted to the building (company) currency at today's rate."""
+        today = fields.Date.context_today(self)
+        for u in self:
+            monthly = 0.0
+            yearly = 0.0
+            active_contracts = u.contract_ids.filtered(
+                lambda c: c.state == 'active'
+                and (not c.start_date or c.start_date <= today)
+                and (not c.end_date or c.end_date >= today)
+            )
+            for c in active_contracts:
+                amount = c.currency_id._rent_convert(
+                    c.amount, u.currency_id, u.building_id.company_id, today, round=False)
+                if c.recurrence == 'month':
+                    monthly += amount
+                    yearly += amount * 12.0
+                else:
+                    yearly += amount
+                    monthly += amount / 12.0
+            u.revenue_monthly_expected = monthly
+            u.revenue_yearly_expected = yearly
+
+    @api.model
+    def _get_date_boundary_fields(self):
+        """Stored fields of units whose value depends on today's date."""
+        return ['revenue_monthly_expected', 'revenue_yearly_expected', 'active_contract_id', 'occupied']
+
+    def _refresh_date_boundaries(self):
+        """Recompute the date-dependent stored fields of these units and of their buildings."""
+        for fname in self._get_date_boundary_fields():
+            self.env.add_to_compute(self._fields[fname], self)
+        buildings = self.building_id
+        for fname in ('revenue_monthly_expected', 'revenue_yearly_expected'):
+            self.env.add_to_compute(buildings._fields[fname], buildings)
+        self.env.flush_all()
+
+    @api.model
+    def cron_refresh_date_boundaries(self):
+        """Daily: refresh units (and buildings) whose contracts started or ended since the last run."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        today = fields.Date.context_today(self)
+        last_run = fields.Date.to_date(ICP.get_param('estate_rent_mgmt.date_boundary_refresh_date')) \
+            or today - timedelta(days=1)
+        if last_run >= today:
+            return
+        # a contract starts counting once start_date <= today and stops once end_date < today
+        contracts = self.env['rent.contract'].search([
+            '|',
+            '&', ('start_date', '>', last_run), ('start_date', '<=', today),
+            '&', ('end_date', '>=', last_run), ('end_date', '<', today),
+        ])
+        # amounts in a foreign currency follow the daily rate
+        for company in self.env['res.company'].sudo().search([]):
+            contracts |= self.env['rent.contract'].search([
+                ('state', '=', 'active'),
+                ('company_id', '=', company.id),
+                ('currency_id', '!=', company.currency_id.id),
+            ])
+        contracts.unit_id._refresh_date_boundaries()
+        ICP.set_param('estate_rent_mgmt.date_boundary_refresh_date', fields.Date.to_string(today))
+
+    @api.depends('owner_id', 'building_id.owner_id')
+    def _compute_effective_owner_id(self):
+        for rec in self:
+            rec.effective_owner_id = rec.owner_id or rec.building_id.owner_id
+
+    effective_owner_id = fields.Many2one(
+        'res.partner', compute=_compute_effective_owner_id, store=True,
+        string="Effective Owner / المالك الفعلي"
+    )
+
+    def action_new_contract(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('New Contract'),
+            'res_model': 'rent.contract',
+            'view_mode': 'form',
+            'target': 'current',
+            'context': {
+                'default_unit_id': self.id,
+                'default_building_id': self.building_id.id,
+                'default_partner_id': self.tenant_id.id or False,
+                'default_company_id': (self.building_id.company_id.id or self.env.company.id),
+            },
+        }
+
+    def _compute_contract_count(self):
+        counts = dict(self.env['rent.contract']._read_group(
+            [('unit_id', 'in', self._origin.ids)], ['unit_id'], ['__count'],
+        ))
+        for u in self:
+            u.contract_count = counts.get(u._origin, 0)
+
+    def action_open_contracts(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Contracts'),
+            'res_model': 'rent.contract',
+            'view_mode': 'list,form',
+            'domain': [('unit_id', '=', self.id)],
+            'target': 'current',
+        }
+
+    def action_open_active_contract(self):
+        self.ensure_one()
+        if self.active_contract_id:
+            return {
+                'type': 'ir.actions.act_window',
+                'name': _('Active Contract'),
+                'res_model': 'rent.contract',
+                'view_mode': 'form',
+                'res_id': self.active_contract_id.id,
+                'target': 'current',
+            }
         return self.action_open_contracts()
\ No newline at end of file
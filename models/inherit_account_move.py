@@ -1,59 +1,161 @@
-from odoo import models, fields, api, _
-
-
-class AccountMove(models.Model):
-    _inherit = 'account.move'
-
-    # Header tags (invoice & payments)
-    x_building_id = fields.Many2one('estate.building', string='البناية')
-    x_unit_id = fields.Many2one('estate.building.unit', string='الوحدة/الشقة', domain="[('building_id','=',x_building_id)]")
-    x_floor = fields.Integer(string='الطابق')
-    x_unit_number = fields.Char(string='الشقة')
-    x_owner_id = fields.Many2one('res.partner', string='المالك / Owner', domain=[('is_property_owner', '=', True)])
-    contract_id = fields.Many2one('rent.contract', string='Rent Contract')
-
-    # Convenience for reporting
-    x_tenant_partner_id = fields.Many2one('res.partner', string='المستأجر', compute='_compute_tenant', store=False)
-
-    @api.depends('partner_id')
-    def _compute_tenant(self):
-        for mv in self:
-            mv.x_tenant_partner_id = mv.partner_id
-
-    
-    def _sync_prepayment_amounts(self):
-        """Push the invoice total/currency into linked rent.prepayment rows."""
-        preps = self.env['rent.prepayment'].search([('move_id', 'in', self.ids)])
-        for prep in preps:
-            new_amt = abs(prep.move_id.amount_total)
-            new_cur = prep.move_id.currency_id.id
-            # write without bouncing back (one-way sync: invoice -> prepayment)
-            prep.with_context(from_invoice_sync=True).write({
-                'amount': new_amt,
-                'currency_id': new_cur,
-            })
-
-    def write(self, vals):
-        res = super().write(vals)
-        # Trigger when invoice content likely changed totals
-        keys = {'invoice_line_ids', 'currency_id', 'line_ids', 'move_type'}
-        if not self.env.context.get('from_prepayment_sync') and keys & set(vals.keys()):
-            self._sync_prepayment_amounts()
-        return res
-
-    def action_post(self):
-        res = super().action_post()
-        if not self.env.context.get('from_prepayment_sync'):
-            self._sync_prepayment_amounts()
-        return res
-
-class AccountMoveLine(models.Model):
-    _inherit = 'account.move.line'
-
-    # Propagate to GL lines (stored, groupable)
-    x_building_id = fields.Many2one('estate.building', related='move_id.x_building_id', store=True)
-    x_unit_id = fields.Many2one('estate.building.unit', related='move_id.x_unit_id', store=True)
-    x_floor = fields.Integer(related='move_id.x_floor', store=True)
-    x_unit_number = fields.Char(related='move_id.x_unit_number', store=True)
-    x_tenant_partner_id = fields.Many2one('res.partner', related='move_id.partner_id', store=True)
-    x_owner_id = fields.Many2one('res.partner', related='move_id.x_owner_id', store=True)
\ No newline at end of file
+from collections import defaultdict
+
+from odoo import models, fields, api, _
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+
+_RENT_STAMP_KEY = 'estate_rent_mgmt.account_stamp'
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    # Header tags (invoice & payments); sparse on a large table, hence the partial (not null) indexes
+    x_building_id = fields.Many2one('estate.building', string='البناية', index='btree_not_null')
+    x_unit_id = fields.Many2one('estate.building.unit', string='الوحدة/الشقة', domain="[('building_id','=',x_building_id)]", index='btree_not_null')
+    x_floor = fields.Integer(string='الطابق')
+    x_unit_number = fields.Char(string='الشقة')
+    x_owner_id = fields.Many2one('res.partner', string='المالك / Owner', domain=[('is_property_owner', '=', True)], index='btree_not_null')
+    contract_id = fields.Many2one('rent.contract', string='Rent Contract', index='btree_not_null')
+    billing_period = fields.Date(string='Billing Period', copy=False, help="First day of the billed rent period.")
+    rent_kind = fields.Selection([
+        ('rent', 'Rent'),
+        ('prepayment', 'Prepayment'),
+        ('utility', 'Utilities'),
+    ], string='Rent Invoice Kind', copy=False)
+
+    # month invoice lookup, invoice counters and the invoices button all filter on these
+    _rent_indexes = [
+        ('account_move_rent_unit_partner_date_idx',
+         ['x_unit_id', 'partner_id', 'x_building_id', 'invoice_date'],
+         "move_type = 'out_invoice' AND x_unit_id IS NOT NULL"),
+        # open receivables per unit (rent roll ageing)
+        ('account_move_rent_unit_open_idx',
+         ['x_unit_id', 'invoice_date_due'],
+         "x_unit_id IS NOT NULL AND state = 'posted' AND payment_state IN ('not_paid', 'partial')"),
+    ]
+
+    def init(self):
+        super().init()
+        for indexname, expressions, where in self._rent_indexes:
+            create_index(self.env.cr, indexname, self._table, expressions, where=where)
+        # one live invoice per contract, period and kind: a second one (cron retry, concurrent
+        # worker) is rejected and reused by _create_month_invoices; also the key of _find_month_invoices
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS account_move_rent_billing_period_uniq
+                ON account_move (contract_id, billing_period, rent_kind)
+             WHERE billing_period IS NOT NULL AND state != 'cancel'
+        """)
+
+    # Prepayment invoices (rent.prepayment.move_id); the flag lets write/post skip every other move cheaply
+    rent_prepayment_ids = fields.One2many('rent.prepayment', 'move_id', string='Rent Prepayments')
+    is_rent_prepayment = fields.Boolean(
+        string='Rent Prepayment Invoice', compute='_compute_is_rent_prepayment', store=True, index=True)
+
+    # Convenience for reporting
+    x_tenant_partner_id = fields.Many2one('res.partner', string='المستأجر', compute='_compute_tenant', store=False)
+
+    @api.depends('partner_id')
+    def _compute_tenant(self):
+        for mv in self:
+            mv.x_tenant_partner_id = mv.partner_id
+
+    @api.depends('rent_prepayment_ids')
+    def _compute_is_rent_prepayment(self):
+        for mv in self:
+            mv.is_rent_prepayment = bool(mv.rent_prepayment_ids)
+
+    
+    def _sync_prepayment_amounts(self):
+        """Push the invoice total/currency into linked rent.prepayment rows."""
+        moves = self.filtered('is_rent_prepayment')
+        if not moves:
+            # vendor bills, bank imports, rent invoices...: nothing to sync
+            return
+        # group by target values: all changed prepayments are synced with one write per distinct value
+        ids_by_vals = defaultdict(list)
+        for prep in moves.rent_prepayment_ids:
+            new_amt = abs(prep.move_id.amount_total)
+            new_cur = prep.move_id.currency_id.id
+            if prep.amount != new_amt or prep.currency_id.id != new_cur:
+                ids_by_vals[(new_amt, new_cur)].append(prep.id)
+        for (new_amt, new_cur), prep_ids in ids_by_vals.items():
+            # write without bouncing back (one-way sync: invoice -> prepayment)
+            self.env['rent.prepayment'].browse(prep_ids).with_context(from_invoice_sync=True).write({
+                'amount': new_amt,
+                'currency_id': new_cur,
+            })
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Trigger when invoice content likely changed totals
+        keys = {'invoice_line_ids', 'currency_id', 'line_ids', 'move_type'}
+        if not self.env.context.get('from_prepayment_sync') and keys & set(vals.keys()):
+            self._sync_prepayment_amounts()
+        return res
+
+    def action_post(self):
+        res = super().action_post()
+        if not self.env.context.get('from_prepayment_sync'):
+            self._sync_prepayment_amounts()
+        return res
+
+class AccountMoveLine(models.Model):
+    _inherit = 'account.move.line'
+
+    # Propagate to GL lines (stored, groupable)
+    x_building_id = fields.Many2one('estate.building', related='move_id.x_building_id', store=True, index='btree_not_null')
+    x_unit_id = fields.Many2one('estate.building.unit', related='move_id.x_unit_id', store=True, index='btree_not_null')
+    x_floor = fields.Integer(related='move_id.x_floor', store=True)
+    x_unit_number = fields.Char(related='move_id.x_unit_number', store=True)
+    x_tenant_partner_id = fields.Many2one('res.partner', related='move_id.partner_id', store=True)
+    x_owner_id = fields.Many2one('res.partner', related='move_id.x_owner_id', store=True, index='btree_not_null')
+
+    # owner / building / unit reporting over journal items
+    _rent_indexes = [
+        ('account_move_line_rent_owner_idx',
+         ['x_owner_id', 'x_building_id', 'x_unit_id', 'date'],
+         "x_owner_id IS NOT NULL"),
+    ]
+
+    def init(self):
+        super().init()
+        for indexname, expressions, where in self._rent_indexes:
+            create_index(self.env.cr, indexname, self._table, expressions, where=where)
+
+
+class AccountAccount(models.Model):
+    _inherit = 'account.account'
+
+    # fields that can change the result of rent.contract._get_default_income_account_id
+    _RENT_INCOME_CACHE_FIELDS = {'account_type', 'active', 'deprecated', 'company_ids'}
+
+    @api.model
+    def _get_rent_cache_stamp(self):
+        """(count, last write_date) of the accounts, fetched once per cursor.
+
+        Part of the ormcache key of rent.contract._get_default_income_account_id: changing the
+        accounts changes the key, so nothing has to clear the registry cache."""
+        stamp = self.env.cr.cache.get(_RENT_STAMP_KEY)
+        if stamp is None:
+            self.flush_model(['write_date'])
+            self.env.cr.execute(SQL("SELECT COUNT(*), MAX(write_date) FROM %s", SQL.identifier(self._table)))
+            stamp = self.env.cr.cache[_RENT_STAMP_KEY] = tuple(self.env.cr.fetchone())
+        return stamp
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        accounts = super().create(vals_list)
+        self.env.cr.cache.pop(_RENT_STAMP_KEY, None)
+        return accounts
+
+    def write(self, vals):
+        res = super().write(vals)
+        if self._RENT_INCOME_CACHE_FIELDS & set(vals):
+            self.env.cr.cache.pop(_RENT_STAMP_KEY, None)
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.cr.cache.pop(_RENT_STAMP_KEY, None)
+        return res
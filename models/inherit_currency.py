@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+_RATE_CACHE_KEY = 'estate_rent_mgmt.rates'
+
+
+class ResCurrency(models.Model):
+    _inherit = 'res.currency'
+
+    def _get_rent_rates(self, company, date):
+        """{currency_id: rate} of the currencies in self for (company, date).
+
+        Rates are kept in the cursor cache, so each (currency, company, date) is fetched once per
+        run (cron run or request) with one _get_rates() query for all the currencies missing."""
+        rates = self.env.cr.cache.setdefault(_RATE_CACHE_KEY, {}).setdefault((company.id, date), {})
+        missing = self.filtered(lambda currency: currency.id not in rates)
+        if missing:
+            rates.update(missing._get_rates(company, date))
+        return rates
+
+    def _rent_convert(self, amount, to_currency, company, date, round=True):
+        """Same as _convert(), through the cached rate table of _get_rent_rates()."""
+        self.ensure_one()
+        if not amount or self == to_currency:
+            converted = amount
+        else:
+            rates = (self | to_currency)._get_rent_rates(company, date)
+            converted = amount * rates[to_currency.id] / rates[self.id]
+        return to_currency.round(converted) if round else converted
+
+    @api.model
+    def _clear_rent_rates(self):
+        self.env.cr.cache.pop(_RATE_CACHE_KEY, None)
+
+
+class ResCurrencyRate(models.Model):
+    _inherit = 'res.currency.rate'
+
+    # a rate changed during the run must not be served stale from the rate table
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['res.currency']._clear_rent_rates()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.env['res.currency']._clear_rent_rates()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env['res.currency']._clear_rent_rates()
+        return super().unlink()
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+import logging
+import tempfile
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+_logger = logging.getLogger(__name__)
+
+
+class RentOwnerStatementRun(models.Model):
+    """Monthly owner statements for the whole portfolio, generated as one background job.
+
+    Owners are handled in batches (``estate_rent_mgmt.cron_batch_size``) with a committed
+    checkpoint; figures come from ``_read_group`` over the stored owner/building/unit tags of
+    the journal items, never from the invoices themselves."""
+    _name = 'rent.owner.statement.run'
+    _description = 'Owner Statement Run'
+    _order = 'date_from desc, id desc'
+
+    name = fields.Char(compute='_compute_name', store=True)
+    company_id = fields.Many2one('res.company', string='الشركة', required=True, default=lambda s: s.env.company)
+    currency_id = fields.Many2one(related='company_id.currency_id')
+    date_from = fields.Date(required=True)
+    date_to = fields.Date(required=True)
+    owner_ids = fields.Many2many('res.partner', string='Owners', domain=[('is_property_owner', '=', True)],
+                                 help="Leave empty for every owner with activity in the period.")
+    output = fields.Selection([('xlsx', 'Excel'), ('pdf', 'PDF'), ('both', 'Excel + PDF')],
+                              default='xlsx', required=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('queued', 'Queued'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], default='draft', required=True, readonly=True)
+    owners_done = fields.Integer(readonly=True, help="Owners already aggregated.")
+    last_owner_id = fields.Integer(readonly=True, copy=False,
+                                   help="Checkpoint: owners are processed by id, a resumed run starts after this one.")
+    owners_total = fields.Integer(readonly=True)
+    rendered = fields.Boolean(readonly=True, help="Output files have been generated.")
+    statement_ids = fields.One2many('rent.owner.statement', 'run_id', string='Statements', readonly=True)
+    attachment_ids = fields.Many2many('ir.attachment', string='Files', readonly=True)
+    message = fields.Text(readonly=True)
+
+    @api.depends('date_from', 'date_to')
+    def _compute_name(self):
+        for run in self:
+            run.name = _("Owner Statements %(start)s → %(end)s", start=run.date_from or '', end=run.date_to or '')
+
+    def action_queue(self):
+        for run in self:
+            if run.date_to < run.date_from:
+                raise UserError(_("The period end must be after its start."))
+        self.write({'state': 'queued', 'message': False})
+        self.env.ref('estate_rent_mgmt.cron_generate_owner_statements')._trigger()
+
+    def action_reset(self):
+        """Restart a failed run from its last checkpoint."""
+        self.filtered(lambda r: r.state == 'failed').write({'state': 'queued', 'message': False})
+
+    # ------------------------------------------------------------ aggregation
+    def _base_domain(self):
+        return [
+            ('company_id', '=', self.company_id.id),
+            ('parent_state', '=', 'posted'),
+            ('move_id.move_type', 'in', ('out_invoice', 'out_refund')),
+            ('date', '>=', self.date_from),
+            ('date', '<=', self.date_to),
+            ('x_owner_id', '!=', False),
+        ]
+
+    def _get_owner_ids(self, after_id=0):
+        """Owners of the run in id order, those after ``after_id`` only (resume checkpoint)."""
+        if self.owner_ids:
+            return [owner_id for owner_id in sorted(self.owner_ids.ids) if owner_id > after_id]
+        domain = self._base_domain() + [('x_owner_id', '>', after_id)]
+        groups = self.env['account.move.line']._read_group(domain, ['x_owner_id'])
+        return sorted(owner.id for owner, in groups)
+
+    def _aggregate(self, owner_ids):
+        """``{(owner, building, unit): {billed, utility, collected, outstanding}}`` for some owners, four queries.
+
+        Billed and utility are the revenue lines of the rent and utility invoices of the period:
+        prepayment invoices and the prepayment consumption lines (negative price) are left out, the
+        rent is counted once, when its period invoice is issued. Collected is the cash received in
+        the period: the payments reconciled with the owners' invoices, at their reconciliation date."""
+        AML = self.env['account.move.line']
+        domain = self._base_domain() + [('x_owner_id', 'in', owner_ids)]
+        groupby = ['x_owner_id', 'x_building_id', 'x_unit_id']
+        utility_products = self.env['rent.utility.type'].with_context(active_test=False).search([]).product_id
+        result = {}
+
+        def bucket(key):
+            return result.setdefault(key, {'billed': 0.0, 'utility': 0.0, 'collected': 0.0, 'outstanding': 0.0})
+
+        product_domain = domain + [
+            ('display_type', '=', 'product'),
+            ('move_id.rent_kind', '!=', 'prepayment'),
+            ('price_unit', '>=', 0),
+        ]
+        for *key, balance in AML._read_group(
+            product_domain + [('product_id', 'not in', utility_products.ids)], groupby, ['balance:sum'],
+        ):
+            bucket(tuple(key))['billed'] += -balance
+        for *key, balance in AML._read_group(
+            product_domain + [('product_id', 'in', utility_products.ids)], groupby, ['balance:sum'],
+        ):
+            bucket(tuple(key))['utility'] += -balance
+        for *key, residual in AML._read_group(
+            domain + [('account_id.account_type', '=', 'asset_receivable')], groupby, ['amount_residual:sum'],
+        ):
+            bucket(tuple(key))['outstanding'] += residual
+        for line, amount in self.env['account.partial.reconcile']._read_group([
+            ('company_id', '=', self.company_id.id),
+            ('max_date', '>=', self.date_from),
+            ('max_date', '<=', self.date_to),
+            ('debit_move_id.x_owner_id', 'in', owner_ids),
+            ('debit_move_id.parent_state', '=', 'posted'),
+            ('debit_move_id.account_id.account_type', '=', 'asset_receivable'),
+            ('debit_move_id.move_id.move_type', '=', 'out_invoice'),
+            # payments and bank reconciliations, not credit notes
+            ('credit_move_id.move_id.move_type', '=', 'entry'),
+        ], ['debit_move_id'], ['amount:sum']):
+            bucket((line.x_owner_id, line.x_building_id, line.x_unit_id))['collected'] += amount
+        return result
+
+    def _generate_statements(self, owner_ids):
+        values = self._aggregate(owner_ids)
+        lines_by_owner = {}
+        for (owner, building, unit), amounts in values.items():
+            lines_by_owner.setdefault(owner.id, []).append({
+                'building_id': building.id,
+                'unit_id': unit.id,
+                **amounts,
+            })
+        self.env['rent.owner.statement'].create([{
+            'run_id': self.id,
+            'owner_id': owner_id,
+            'line_ids': [fields.Command.create(vals) for vals in lines_by_owner[owner_id]],
+        } for owner_id in owner_ids if owner_id in lines_by_owner])
+
+    # ---------------------------------------------------------------- process
+    @api.model
+    def cron_generate_owner_statements(self):
+        for run in self.search([('state', '=', 'queued')], order='id'):
+            run._process()
+
+    def _process(self):
+        self.ensure_one()
+        Contract = self.env['rent.contract']
+        auto_commit = Contract._cron_auto_commit()
+        batch_size = Contract._get_cron_batch_size()
+        try:
+            # every step runs in a savepoint: after a SQL error the run can still be marked failed
+            with self.env.cr.savepoint():
+                # resume after the last owner done: owners added or removed since do not shift the rest
+                owner_ids = self._get_owner_ids(after_id=self.last_owner_id)
+                self.owners_total = self.owners_done + len(owner_ids)
+            for batch in split_every(batch_size, owner_ids):
+                with self.env.cr.savepoint():
+                    self._generate_statements(list(batch))
+                    self.owners_done += len(batch)
+                    self.last_owner_id = batch[-1]
+                if auto_commit:
+                    self.env.cr.commit()
+                # keep memory bounded on large portfolios
+                self.env.invalidate_all()
+            if not self.rendered:
+                with self.env.cr.savepoint():
+                    self._render_outputs()
+                    self.rendered = True
+        except Exception as e:  # noqa: BLE001 - the error is kept on the run for the user
+            _logger.exception("Owner statement run %s failed after %s owners", self.id, self.owners_done)
+            self.write({'state': 'failed', 'message': str(e)})
+        else:
+            self.write({'state': 'done'})
+        if auto_commit:
+            self.env.cr.commit()
+
+    # ---------------------------------------------------------------- outputs
+    def _render_outputs(self):
+        attachments = self.env['ir.attachment']
+        if self.output in ('xlsx', 'both'):
+            attachments |= self._render_xlsx()
+        if self.output in ('pdf', 'both'):
+            attachments |= self._render_pdf()
+        self.attachment_ids = [fields.Command.link(att.id) for att in attachments]
+
+    def _attach(self, filename, data, mimetype):
+        return self.env['ir.attachment'].create({
+            'name': filename,
+            'raw': data,
+            'mimetype': mimetype,
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+
+    def _render_xlsx(self):
+        """One workbook for the run; rows are flushed to disk as they are written (constant_memory)."""
+        if xlsxwriter is None:
+            raise UserError(_("Generating XLSX files requires the Python library xlsxwriter."))
+        Line = self.env['rent.owner.statement.line']
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as tmp:
+            workbook = xlsxwriter.Workbook(tmp.name, {'constant_memory': True})
+            sheet = workbook.add_worksheet(_('Owner Statements'))
+            bold = workbook.add_format({'bold': True})
+            money = workbook.add_format({'num_format': '#,##0.00'})
+            headers = [_('Owner'), _('Building'), _('Unit'), _('Rent Billed'), _('Utilities'),
+                       _('Collected'), _('Outstanding')]
+            sheet.write_row(0, 0, headers, bold)
+            row = 1
+            line_ids = Line.search([('run_id', '=', self.id)], order='owner_id, building_id, unit_id').ids
+            for chunk in split_every(self.env['rent.contract']._get_cron_batch_size(), line_ids):
+                for line in Line.browse(chunk):
+                    sheet.write_row(row, 0, [
+                        line.owner_id.display_name,
+                        line.building_id.display_name or '',
+                        line.unit_id.display_name or '',
+                    ])
+                    sheet.write_row(row, 3, [line.billed, line.utility, line.collected, line.outstanding], money)
+                    row += 1
+                self.env.invalidate_all()
+            workbook.close()
+            tmp.seek(0)
+            data = tmp.read()
+        return self._attach('%s.xlsx' % self.name, data,
+                            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    def _render_pdf(self):
+        """One PDF per batch of owners, so that wkhtmltopdf never renders the whole portfolio at once."""
+        attachments = self.env['ir.attachment']
+        report = self.env.ref('estate_rent_mgmt.action_report_owner_statement')
+        statement_ids = self.statement_ids.ids
+        for index, chunk in enumerate(split_every(self._get_pdf_batch_size(), statement_ids), start=1):
+            pdf, _report_type = self.env['ir.actions.report']._render_qweb_pdf(report, list(chunk))
+            attachments |= self._attach('%s - %s.pdf' % (self.name, index), pdf, 'application/pdf')
+            self.env.invalidate_all()
+        return attachments
+
+    @api.model
+    def _get_pdf_batch_size(self):
+        size = self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.statement_pdf_batch_size', 200)
+        return max(int(size), 1)
+
+
+class RentOwnerStatement(models.Model):
+    _name = 'rent.owner.statement'
+    _description = 'Owner Statement'
+    _order = 'run_id desc, owner_id'
+
+    run_id = fields.Many2one('rent.owner.statement.run', required=True, ondelete='cascade', index=True)
+    owner_id = fields.Many2one('res.partner', string='Owner / المالك', required=True, index=True)
+    date_from = fields.Date(related='run_id.date_from')
+    date_to = fields.Date(related='run_id.date_to')
+    company_id = fields.Many2one(related='run_id.company_id', store=True)
+    currency_id = fields.Many2one(related='run_id.currency_id')
+    line_ids = fields.One2many('rent.owner.statement.line', 'statement_id', string='Lines')
+    billed = fields.Monetary(string='Rent Billed', compute='_compute_totals', store=True)
+    utility = fields.Monetary(string='Utilities', compute='_compute_totals', store=True)
+    collected = fields.Monetary(compute='_compute_totals', store=True)
+    outstanding = fields.Monetary(compute='_compute_totals', store=True)
+
+    @api.depends('line_ids.billed', 'line_ids.utility', 'line_ids.collected', 'line_ids.outstanding')
+    def _compute_totals(self):
+        for st in self:
+            st.billed = sum(st.line_ids.mapped('billed'))
+            st.utility = sum(st.line_ids.mapped('utility'))
+            st.collected = sum(st.line_ids.mapped('collected'))
+            st.outstanding = sum(st.line_ids.mapped('outstanding'))
+
+
+class RentOwnerStatementLine(models.Model):
+    _name = 'rent.owner.statement.line'
+    _description = 'Owner Statement Line'
+    _order = 'statement_id, building_id, unit_id'
+
+    statement_id = fields.Many2one('rent.owner.statement', required=True, ondelete='cascade', index=True)
+    run_id = fields.Many2one(related='statement_id.run_id', store=True, index=True)
+    owner_id = fields.Many2one(related='statement_id.owner_id', store=True)
+    currency_id = fields.Many2one(related='statement_id.currency_id')
+    building_id = fields.Many2one('estate.building', string='البناية')
+    unit_id = fields.Many2one('estate.building.unit', string='الوحدة/الشقة')
+    billed = fields.Monetary(string='Rent Billed')
+    utility = fields.Monetary(string='Utilities')
+    collected = fields.Monetary()
+    outstanding = fields.Monetary()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+
+
+class EstateOwnerTransferWizard(models.TransientModel):
+    _name = 'estate.owner.transfer.wizard'
+    _description = 'Transfer Buildings / Units to a New Owner'
+
+    building_ids = fields.Many2many('estate.building', string='Buildings')
+    unit_ids = fields.Many2many(
+        'estate.building.unit', string='Units',
+        help="Units to transfer. Leave empty to transfer the selected buildings with all their units.")
+    new_owner_id = fields.Many2one(
+        'res.partner', string='New Owner / المالك الجديد', required=True,
+        domain=[('is_property_owner', '=', True)])
+    effective_date = fields.Date(string='Effective Date', required=True, default=fields.Date.context_today)
+    update_open_invoices = fields.Boolean(
+        string='Re-tag Open Invoices', default=True,
+        help="Also move the owner tag of open customer invoices dated on/after the effective date, "
+             "and of their journal items, to the new owner.")
+    chunk_size = fields.Integer(default=1000, help="Units per SQL statement when re-tagging invoices.")
+
+    @api.constrains('effective_date')
+    def _check_effective_date(self):
+        today = fields.Date.context_today(self)
+        for wiz in self:
+            if wiz.effective_date > today:
+                raise ValidationError(_("The ownership changes right away: the effective date cannot be in the future."))
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        ctx = self.env.context
+        active_ids = ctx.get('active_ids') or []
+        if ctx.get('active_model') == 'estate.building' and 'building_ids' in fields_list:
+            res.setdefault('building_ids', [fields.Command.set(active_ids)])
+        elif ctx.get('active_model') == 'estate.building.unit' and 'unit_ids' in fields_list:
+            res.setdefault('unit_ids', [fields.Command.set(active_ids)])
+        return res
+
+    def action_transfer(self):
+        self.ensure_one()
+        if not self.building_ids and not self.unit_ids:
+            raise UserError(_("Select at least one building or unit to transfer."))
+        new_owner = self.new_owner_id
+
+        candidates = self.unit_ids | self.building_ids.unit_ids
+        old_owners = {unit.id: unit.effective_owner_id for unit in candidates}
+        if self.building_ids:
+            # units that explicitly carried the old building owner follow the building
+            follow_units = self.building_ids.unit_ids.filtered(
+                lambda u: u.owner_id and u.owner_id == u.building_id.owner_id
+            )
+            self.building_ids.write({'owner_id': new_owner.id})
+            follow_units.write({'owner_id': False})
+        if self.unit_ids:
+            self.unit_ids.write({'owner_id': new_owner.id})
+
+        # effective_owner_id and rent.contract.owner_id (draft/active contracts) are recomputed in batch
+        self.env.flush_all()
+
+        # units keeping their own owner are not transferred
+        units = candidates.filtered(lambda u: u.effective_owner_id == new_owner and old_owners[u.id] != new_owner)
+        move_count = 0
+        if self.update_open_invoices:
+            move_count = self._retag_open_invoices(units, new_owner, old_owners)
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'success',
+                'message': _("%(units)s units transferred to %(owner)s, %(moves)s open invoices re-tagged.",
+                             units=len(units), owner=new_owner.display_name, moves=move_count),
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
+
+    def _retag_open_invoices(self, units, new_owner, old_owners):
+        """Move x_owner_id from the previous owner to the new one on the open customer invoices of the
+        units (and on their journal items) with chunked UPDATEs, instead of an ORM write that
+        recomputes the related field line by line. Invoices of expired or cancelled contracts stay
+        with the owner they were issued for."""
+        cr = self.env.cr
+        unit_ids_by_owner = defaultdict(list)
+        for unit in units:
+            unit_ids_by_owner[old_owners[unit.id].id].append(unit.id)
+        move_ids = []
+        for old_owner_id, owner_unit_ids in unit_ids_by_owner.items():
+            for unit_ids in split_every(max(self.chunk_size, 1), owner_unit_ids):
+                cr.execute("""
+                    UPDATE account_move
+                       SET x_owner_id = %(owner)s
+                     WHERE x_unit_id IN %(units)s
+                       AND move_type IN ('out_invoice', 'out_refund')
+                       AND (invoice_date IS NULL OR invoice_date >= %(date)s)
+                       AND (state = 'draft'
+                            OR (state = 'posted' AND payment_state IN ('not_paid', 'partial')))
+                       AND x_owner_id IS NOT DISTINCT FROM %(old_owner)s
+                       AND (contract_id IS NULL
+                            OR contract_id IN (SELECT id FROM rent_contract WHERE state IN ('draft', 'active')))
+                 RETURNING id
+                """, {'owner': new_owner.id, 'old_owner': old_owner_id or None, 'units': tuple(unit_ids),
+                      'date': self.effective_date})
+                chunk_move_ids = [row[0] for row in cr.fetchall()]
+                if not chunk_move_ids:
+                    continue
+                cr.execute("""
+                    UPDATE account_move_line
+                       SET x_owner_id = %s
+                     WHERE move_id IN %s
+                """, [new_owner.id, tuple(chunk_move_ids)])
+                move_ids += chunk_move_ids
+
+        if move_ids:
+            moves = self.env['account.move'].browse(move_ids)
+            moves.invalidate_recordset(['x_owner_id'])
+            self.env['account.move.line'].invalidate_model(['x_owner_id'])
+        return len(move_ids)
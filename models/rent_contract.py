@@ -1,343 +1,732 @@
-from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
-from odoo import _, fields
-from odoo.exceptions import ValidationError, UserError 
-class RentContract(models.Model):
-    _name = 'rent.contract'
-    _description = 'Rent Contract'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
-
-    name = fields.Char(string='العقد', compute='_compute_name', store=True)
-
-    partner_id = fields.Many2one('res.partner', string='المستأجر', required=True, tracking=True)
-    building_id = fields.Many2one('estate.building', string='البناية', required=True, tracking=True)
-    owner_id = fields.Many2one('res.partner', string="Owner / المالك", compute='_compute_owner', store=True)
-    unit_id = fields.Many2one('estate.building.unit', string='الوحدة/الشقة', required=True, domain="[('building_id','=',building_id)]", tracking=True)
-
-    company_id = fields.Many2one('res.company', string='الشركة', default=lambda self: self.env.company, required=True)
-
-    currency_id = fields.Many2one(
-        'res.currency', string='Currency', required=True, tracking=True,
-        default=lambda self: self.env.company.currency_id
-    )
-
-    company_currency_id = fields.Many2one(
-        'res.currency', string='Company Currency',
-        related='company_id.currency_id', store=False, readonly=True
-    )
-
-    responsible_id = fields.Many2one( 'res.users', string='Responsible', default=lambda self: self.env.user, tracking=True, help="User who will receive the payment reminder activity.")
-    rent_due_day = fields.Integer(string='Rent Due Day', default=1, tracking=True, help='Day of month the rent is due (1..31).')
-    last_due_activity_date = fields.Date(string='Last Due Activity', readonly=True)
-
-    amount = fields.Monetary(string='مبلغ الإيجار', required=True,  currency_field='currency_id')
-    recurrence = fields.Selection([('month', 'شهري'), ('year', 'سنوي')], string='دورية الدفع', default='month', required=True)
-
-    start_date = fields.Date(string='تاريخ البداية', required=True)
-    end_date = fields.Date(string='تاريخ النهاية')
-
-    state = fields.Selection([
-        ('draft', 'مسودة'),
-        ('active', 'فعّال'),
-        ('expired', 'منتهي'),
-        ('cancelled', 'ملغى')
-    ], default='draft', tracking=True)
-
-    monthly_amount = fields.Monetary(compute='_compute_normalized', string='شهريًا', store=False, currency_field='currency_id')
-    yearly_amount = fields.Monetary(compute='_compute_normalized', string='سنويًا', store=False, currency_field='currency_id')
-
-    invoice_count = fields.Integer(compute='_compute_invoice_count')
-
-
-    
-    @api.onchange('company_id')
-    def _onchange_company_id_currency(self):
-        for rec in self:
-            if rec.company_id and (not rec.currency_id or rec.currency_id == rec.company_currency_id):
-                # when switching company, default the contract currency to that company’s currency
-                rec.currency_id = rec.company_id.currency_id
-
-    @api.depends('partner_id', 'building_id', 'unit_id')
-    def _compute_name(self):
-        for rec in self:
-            parts = []
-            if rec.building_id: parts.append(rec.building_id.name)
-            if rec.unit_id: parts.append(rec.unit_id.unit_number or rec.unit_id.name)
-            if rec.partner_id: parts.append(rec.partner_id.display_name)
-            rec.name = ' - '.join(parts) or _('Rent Contract')
-
-    @api.depends('amount', 'recurrence')
-    def _compute_normalized(self):
-        for rec in self:
-            if rec.recurrence == 'month':
-                rec.monthly_amount = rec.amount
-                rec.yearly_amount = rec.amount * 12.0
-            else:
-                rec.monthly_amount = rec.amount / 12.0
-                rec.yearly_amount = rec.amount
-
-    _sql_constraints = [
-        ('contract_unique_active', 'unique(unit_id, state)', 'لا يمكن أن تكون هناك أكثر من عقد فعّال لنفس الوحدة.'),
-    ]
-
-    def action_set_active(self):
-        for rec in self:
-            rec.state = 'active'
-            # rec.unit_id.tenant_id = rec.partner_id
-
-    def action_set_expired(self):
-        self.write({'state': 'expired'})
-
-    def action_cancel(self):
-        self.write({'state': 'cancelled'})
-
-    def _prepare_invoice_vals(self):
-        self.ensure_one()
-
-        # Use company context (v18) — don't filter on company_id in the domain
-        Account = self.env['account.account'].with_company(self.company_id)
-
-        # v18 uses `account_type` (fallback to internal_group just in case)
-        income_account = Account.search([('account_type', '=', 'income')], limit=1)
-        if not income_account:
-            income_account = Account.search([('internal_group', '=', 'income')], limit=1)
-
-        if not income_account:
-            raise ValidationError(_(
-                "No income account found for company %s. "
-                "Please create an Account with account_type='income'."
-            ) % (self.company_id.display_name,))
-
-        return {
-            'move_type': 'out_invoice',
-            'partner_id': self.partner_id.id,
-            'company_id': self.company_id.id,
-            'invoice_date': fields.Date.context_today(self),
-            'currency_id': self.currency_id.id,
-            'x_building_id': self.building_id.id,
-            'x_unit_id': self.unit_id.id,
-            'x_floor': self.unit_id.floor,
-            'x_unit_number': self.unit_id.unit_number,
-            'x_owner_id': self.owner_id.id,
-            'invoice_line_ids': [
-                (0, 0, {
-                    'name': self.name,
-                    'quantity': 1.0,
-                    'price_unit': self.amount if self.recurrence == 'month' else (self.amount / 12.0),
-                    'account_id': income_account.id,
-                })
-            ],
-        }
-    def action_create_invoice(self):
-        moves = self.env['account.move']
-        for rec in self:
-            mv = self.env['account.move'].create(rec._prepare_invoice_vals())
-            rec._apply_prepayment_to_invoice(mv)  # keep your prepayment consumption
-            moves |= mv
-
-        if len(moves) == 1:
-            # Open the single created invoice in FORM view
-            form_view = self.env.ref('account.view_move_form', raise_if_not_found=False)
-            return {
-                'type': 'ir.actions.act_window',
-                'name': _('Customer Invoice'),
-                'res_model': 'account.move',
-                'res_id': moves.id,
-                'view_mode': 'form',
-                'views': [(form_view.id, 'form')] if form_view else [(False, 'form')],
-                'target': 'current',
-                'context': {'default_move_type': 'out_invoice'},
-            }
-        # Otherwise show the list of all created invoices (your current behavior)
-        return {
-            'type': 'ir.actions.act_window',
-            'name': _('Invoices'),
-            'res_model': 'account.move',
-            'view_mode': 'list,form',
-            'domain': [('id', 'in', moves.ids)],
-            'context': {'default_move_type': 'out_invoice'},
-        }
-    
-    def _compute_invoice_count(self):
-        for rec in self:
-            rec.invoice_count = self.env['account.move'].search_count([
-                ('move_type', '=', 'out_invoice'), ('partner_id', '=', rec.partner_id.id), ('x_building_id', '=', rec.building_id.id), ('x_unit_id', '=', rec.unit_id.id)
-            ])
-
-    def action_view_invoices(self):
-        self.ensure_one()
-        return {
-            'type': 'ir.actions.act_window',
-            'name': _('Invoices'),
-            'res_model': 'account.move',
-            'view_mode': 'list,form',
-            'domain': [
-                ('move_type', '=', 'out_invoice'),
-                ('partner_id', '=', self.partner_id.id),
-                ('x_building_id', '=', self.building_id.id),
-                ('x_unit_id', '=', self.unit_id.id),
-            ],
-        }
-
-
-    @api.constrains('rent_due_day')
-    def _check_rent_due_day(self):
-        for rec in self:
-            if not (1 <= rec.rent_due_day <= 31):
-                raise ValidationError(_("Rent Due Day must be between 1 and 31."))
-
-    # === CRON ENTRYPOINT ===
-    @api.model
-    def cron_create_rent_due_activities(self):
-        today = fields.Date.context_today(self)
-        domain = [
-            ('state', '=', 'active'),
-            '|', ('start_date', '=', False), ('start_date', '<=', today),
-            '|', ('end_date', '=', False), ('end_date', '>=', today),
-            ('rent_due_day', '=', today.day),
-            '|', ('last_due_activity_date', '=', False), ('last_due_activity_date', '<', today),
-        ]
-        contracts = self.search(domain)
-        if not contracts:
-            return
-
-        todo_type = self.env.ref('mail.mail_activity_data_todo')
-        for c in contracts:
-            # expected monthly due (handles month/year recurrence)
-            monthly_due = c.amount if c.recurrence == 'month' else (c.amount / 12.0)
-            # available prepayment
-            prepay_bal = c._get_prepayment_balance() if hasattr(c, '_get_prepayment_balance') else 0.0
-
-            if prepay_bal >= monthly_due:
-                # Option 1: no activity (quiet mode), just stamp the date so we don't remind again today
-                c.last_due_activity_date = today
-                # Option 2: create an FYI activity instead of skipping:
-                # c.activity_schedule(
-                #     activity_type_id=todo_type.id,
-                #     date_deadline=today,
-                #     user_id=c.responsible_id.id or self.env.user.id,
-                #     summary=_('Rent covered by advance payment'),
-                #     note=_('This month’s rent is fully covered by prepayment. Balance: %.2f') % prepay_bal,
-                # )
-                continue
-
-            # Not fully covered → create the usual reminder
-            c.activity_schedule(
-                activity_type_id=todo_type.id,
-                date_deadline=today,
-                user_id=c.responsible_id.id or self.env.user.id,
-                summary=_('Pay Rent'),
-                note=_('Rent is due today for %s — %s / %s.') % (
-                    c.partner_id.display_name, c.building_id.name or '',
-                    (c.unit_id.unit_number or c.unit_id.display_name or '')
-                ),
-            )
-            c.last_due_activity_date = today
-
-    @api.depends('unit_id', 'unit_id.effective_owner_id')
-    def _compute_owner(self):
-        for rec in self:
-            rec.owner_id = rec.unit_id.effective_owner_id
-    
-    def _get_tenant_partner(self):
-        self.ensure_one()
-        for fname in ('partner_id', 'tenant_id', 'tenant_partner_id', 'x_tenant_partner_id', 'customer_id'):
-            if fname in self._fields and getattr(self, fname):
-                return getattr(self, fname)
-        raise UserError(_("Please set a tenant/customer on this contract."))
-
-    def action_create_prepayment_invoice(self):
-        self.ensure_one()
-        partner = self._get_tenant_partner()
-
-        # default to the monthly charge
-        monthly_price = self.amount if self.recurrence == 'month' else (self.amount / 12.0)
-
-        move = self.env['account.move'].create({
-            'move_type': 'out_invoice',
-            'partner_id': partner.id,
-            'invoice_origin': self.name or _('Rent Contract'),
-            'company_id': self.company_id.id,
-            'currency_id': self.currency_id.id,
-            'invoice_date': fields.Date.context_today(self),
-
-            'x_building_id': self.building_id.id,
-            'x_unit_id': self.unit_id.id,
-            'x_floor': self.unit_id.floor,
-            'x_unit_number': self.unit_id.unit_number,
-            'x_owner_id': self.owner_id.id,
-
-            'invoice_line_ids': [(0, 0, {
-                'name': _('Rent Prepayment for %s') % (self.name or ''),
-                'quantity': 1.0,
-                'price_unit': monthly_price,   
-            })],
-        })
-
-        if hasattr(move, '_onchange_invoice_line_ids'):
-            move._onchange_invoice_line_ids()
-
-        # create the linked prepayment so it shows in the O2M immediately
-        self.env['rent.prepayment'].create({
-            'contract_id': self.id,
-            'date': fields.Date.context_today(self),
-            'months': 1,                                  
-            'amount': abs(move.amount_total),              
-            'currency_id': self.currency_id.id,
-            'description': _('Advance payment'),
-            'move_id': move.id,                           
-        })
-
-        form_view = self.env.ref('account.view_move_form', raise_if_not_found=False)
-        return {
-            'type': 'ir.actions.act_window',
-            'name': _('Customer Invoice'),
-            'res_model': 'account.move',
-            'res_id': move.id,
-            'view_mode': 'form',
-            'views': [(form_view.id, 'form')] if form_view else [(False, 'form')],
-            'target': 'current',
-            'context': {'default_move_type': 'out_invoice'},
-        }
-
-
-    @api.model
-    def default_get(self, fields_list):
-        res = super().default_get(fields_list)
-        ctx = self.env.context
-        unit = False
-
-        if ctx.get('default_unit_id'):
-            unit = self.env['estate.building.unit'].browse(ctx['default_unit_id'])
-        elif ctx.get('active_model') == 'estate.building.unit' and ctx.get('active_id'):
-            unit = self.env['estate.building.unit'].browse(ctx['active_id'])
-
-        if unit:
-            # unit & building
-            if 'unit_id' in fields_list and not res.get('unit_id'):
-                res['unit_id'] = unit.id
-            if 'building_id' in fields_list and not res.get('building_id'):
-                res['building_id'] = unit.building_id.id
-
-            # tenant (if there is a current tenant on the unit)
-            if 'partner_id' in fields_list and not res.get('partner_id') and unit.tenant_id:
-                res['partner_id'] = unit.tenant_id.id
-
-            # company (from building if set)
-            if 'company_id' in fields_list and not res.get('company_id') and unit.building_id.company_id:
-                res['company_id'] = unit.building_id.company_id.id
-
-            # start date today
-            if 'start_date' in fields_list and not res.get('start_date'):
-                res['start_date'] = fields.Date.context_today(self)
-
-        return res
-
-    # --- when user picks a unit manually, auto-fill building & tenant too ---
-    @api.onchange('unit_id')
-    def _onchange_unit_id_fill_from_unit(self):
-        for rec in self:
-            if rec.unit_id:
-                rec.building_id = rec.unit_id.building_id
-                if not rec.partner_id and rec.unit_id.tenant_id:
+import calendar
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo import _, fields
+from odoo.exceptions import ValidationError, UserError 
+from odoo.tools import SQL, ormcache, split_every
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+
+class RentContract(models.Model):
+    _name = 'rent.contract'
+    _description = 'Rent Contract'
+    _inherit = ['mail.thread', 'mail.activity.mixin']
+
+    name = fields.Char(string='العقد', compute='_compute_name', store=True)
+
+    partner_id = fields.Many2one('res.partner', string='المستأجر', required=True, tracking=True)
+    building_id = fields.Many2one('estate.building', string='البناية', required=True, tracking=True)
+    owner_id = fields.Many2one('res.partner', string="Owner / المالك", compute='_compute_owner', store=True)
+    unit_id = fields.Many2one('estate.building.unit', string='الوحدة/الشقة', required=True, domain="[('building_id','=',building_id)]", tracking=True)
+
+    company_id = fields.Many2one('res.company', string='الشركة', default=lambda self: self.env.company, required=True)
+
+    currency_id = fields.Many2one(
+        'res.currency', string='Currency', required=True, tracking=True,
+        default=lambda self: self.env.company.currency_id
+    )
+
+    company_currency_id = fields.Many2one(
+        'res.currency', string='Company Currency',
+        related='company_id.currency_id', store=False, readonly=True
+    )
+
+    responsible_id = fields.Many2one( 'res.users', string='Responsible', default=lambda self: self.env.user, tracking=True, help="User who will receive the payment reminder activity.")
+    rent_due_day = fields.Integer(string='Rent Due Day', default=1, tracking=True, help='Day of month the rent is due (1..31).')
+    last_due_activity_date = fields.Date(string='Last Due Activity', readonly=True)
+    last_reminder_date = fields.Date(
+        string='Last Reminder', readonly=True, copy=False,
+        help="Date of the last due reminder: each due date is reminded once, until billing moves to the next one.")
+    next_due_date = fields.Date(
+        string='Next Due Date', compute='_compute_next_due_date', store=True, readonly=False, index=True,
+        help="Next rent due date not yet processed by the billing cron. Advanced one period at a time.")
+
+    amount = fields.Monetary(string='مبلغ الإيجار', required=True,  currency_field='currency_id')
+    recurrence = fields.Selection([('month', 'شهري'), ('year', 'سنوي')], string='دورية الدفع', default='month', required=True)
+
+    start_date = fields.Date(string='تاريخ البداية', required=True)
+    end_date = fields.Date(string='تاريخ النهاية')
+
+    state = fields.Selection([
+        ('draft', 'مسودة'),
+        ('active', 'فعّال'),
+        ('expired', 'منتهي'),
+        ('cancelled', 'ملغى')
+    ], default='draft', tracking=True)
+
+    monthly_amount = fields.Monetary(compute='_compute_normalized', string='شهريًا', store=False, currency_field='currency_id')
+    yearly_amount = fields.Monetary(compute='_compute_normalized', string='سنويًا', store=False, currency_field='currency_id')
+
+    invoice_count = fields.Integer(compute='_compute_invoice_count')
+
+
+    
+    @api.onchange('company_id')
+    def _onchange_company_id_currency(self):
+        for rec in self:
+            if rec.company_id and (not rec.currency_id or rec.currency_id == rec.company_currency_id):
+                # when switching company, default the contract currency to that company’s currency
+                rec.currency_id = rec.company_id.currency_id
+
+    @api.depends('partner_id', 'building_id', 'unit_id')
+    def _compute_name(self):
+        for rec in self:
+            parts = []
+            if rec.building_id: parts.append(rec.building_id.name)
+            if rec.unit_id: parts.append(rec.unit_id.unit_number or rec.unit_id.name)
+            if rec.partner_id: parts.append(rec.partner_id.display_name)
+            rec.name = ' - '.join(parts) or _('Rent Contract')
+
+    @api.depends('amount', 'recurrence')
+    def _compute_normalized(self):
+        for rec in self:
+            if rec.recurrence == 'month':
+                rec.monthly_amount = rec.amount
+                rec.yearly_amount = rec.amount * 12.0
+            else:
+                rec.monthly_amount = rec.amount / 12.0
+                rec.yearly_amount = rec.amount
+
+    # (name, expressions, where) of the composite/partial indexes behind the cron selections,
+    # created by init(); see benchmarks/explain_rent_lookups.py for their plans
+    _rent_indexes = [
+        ('rent_contract_active_due_idx', ['next_due_date', 'last_due_activity_date'], "state = 'active'"),
+        ('rent_contract_active_end_idx', ['end_date'], "state = 'active' AND end_date IS NOT NULL"),
+        ('rent_contract_draft_start_idx', ['start_date'], "state = 'draft'"),
+    ]
+
+    def init(self):
+        super().init()
+        # at most one ACTIVE contract per unit (any number of expired/cancelled ones);
+        # replaces the former unique(unit_id, state) constraint, dropped by the 18.0.1.2.0 migration
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS rent_contract_unit_active_uniq
+                ON rent_contract (unit_id) WHERE state = 'active'
+        """)
+        for indexname, expressions, where in self._rent_indexes:
+            create_index(self.env.cr, indexname, self._table, expressions, where=where)
+
+    @api.constrains('unit_id', 'state')
+    def _check_single_active_contract(self):
+        active = self.filtered(lambda c: c.state == 'active')
+        if not active:
+            return
+        groups = self._read_group(
+            [('unit_id', 'in', active.unit_id.ids), ('state', '=', 'active')], ['unit_id'], ['__count'],
+        )
+        if any(count > 1 for _unit, count in groups):
+            raise ValidationError('لا يمكن أن تكون هناك أكثر من عقد فعّال لنفس الوحدة.')
+
+    def action_set_active(self):
+        for rec in self:
+            rec.state = 'active'
+            # rec.unit_id.tenant_id = rec.partner_id
+
+    def action_set_expired(self):
+        self.write({'state': 'expired'})
+
+    def action_cancel(self):
+        self.write({'state': 'cancelled'})
+
+    @api.model
+    def cron_update_contract_lifecycle(self):
+        """Daily: expire active contracts whose end_date passed and activate draft contracts whose
+        period started, with set-based writes (state changes are system-driven: no tracking)."""
+        today = fields.Date.context_today(self)
+        contracts = self.with_context(tracking_disable=True)
+
+        to_expire = contracts.search([
+            ('state', '=', 'active'),
+            ('end_date', '!=', False),
+            ('end_date', '<', today),
+        ])
+        if to_expire:
+            to_expire.write({'state': 'expired'})
+
+        candidates = contracts.search([
+            ('state', '=', 'draft'),
+            ('start_date', '<=', today),
+            '|', ('end_date', '=', False), ('end_date', '>=', today),
+        ], order='start_date, id')
+        if not candidates:
+            return
+        # one active contract per unit: skip occupied units, and keep the earliest draft of each unit
+        busy_unit_ids = set(contracts.search([
+            ('state', '=', 'active'),
+            ('unit_id', 'in', candidates.unit_id.ids),
+        ]).unit_id.ids)
+        to_activate_ids = []
+        for c in candidates:
+            if c.unit_id.id not in busy_unit_ids:
+                busy_unit_ids.add(c.unit_id.id)
+                to_activate_ids.append(c.id)
+        if to_activate_ids:
+            contracts.browse(to_activate_ids).write({'state': 'active'})
+
+    @api.model
+    def _get_default_income_account_id(self, company_id):
+        """Income account id used for rent lines of a company.
+
+        Cached per company and accounts stamp (account count and last write_date), so an account
+        change selects a fresh entry instead of clearing the registry cache."""
+        return self._get_cached_income_account_id(company_id, self.env['account.account']._get_rent_cache_stamp())
+
+    @api.model
+    @ormcache('company_id', 'stamp')
+    def _get_cached_income_account_id(self, company_id, stamp):
+        company = self.env['res.company'].browse(company_id)
+        Account = self.env['account.account'].sudo().with_company(company)
+        company_domain = Account._check_company_domain(company)
+
+        # v18 uses `account_type` (fallback to internal_group just in case)
+        income_account = Account.search(company_domain + [('account_type', '=', 'income')], limit=1)
+        if not income_account:
+            income_account = Account.search(company_domain + [('internal_group', '=', 'income')], limit=1)
+        return income_account.id
+
+    def _get_rent_income_account(self):
+        """Rent income account: the building's own account if set, else the (cached) company default."""
+        self.ensure_one()
+        if self.building_id.income_account_id:
+            return self.building_id.income_account_id
+        return self.env['account.account'].browse(self._get_default_income_account_id(self.company_id.id))
+
+    def _prepare_invoice_vals(self, on_date=None):
+        """Rent invoice of the period due on on_date (default: today)."""
+        self.ensure_one()
+
+        income_account = self._get_rent_income_account()
+        if not income_account:
+            raise ValidationError(_(
+                "No income account found for company %s. "
+                "Please create an Account with account_type='income'."
+            ) % (self.company_id.display_name,))
+
+        invoice_date = on_date or fields.Date.context_today(self)
+        return {
+            'move_type': 'out_invoice',
+            'partner_id': self.partner_id.id,
+            'company_id': self.company_id.id,
+            'invoice_date': invoice_date,
+            'currency_id': self.currency_id.id,
+            'contract_id': self.id,
+            'billing_period': self._get_billing_period(invoice_date),
+            'rent_kind': 'rent',
+            'x_building_id': self.building_id.id,
+            'x_unit_id': self.unit_id.id,
+            'x_floor': self.unit_id.floor,
+            'x_unit_number': self.unit_id.unit_number,
+            'x_owner_id': self.owner_id.id,
+            'invoice_line_ids': [
+                (0, 0, {
+                    'name': self.name,
+                    'quantity': 1.0,
+                    # one invoice per period: a yearly contract bills its full amount once a year
+                    'price_unit': self._get_period_amount(invoice_date),
+                    'account_id': income_account.id,
+                })
+            ],
+        }
+    def action_create_invoice(self):
+        # idempotent: a contract already billed for this month gets its existing invoice back
+        today = fields.Date.context_today(self)
+        not_due = self.filtered(lambda c: not c._is_due_in_month(today))
+        if not_due:
+            raise UserError(_(
+                "No rent period is due this month for: %s. Yearly contracts are invoiced in their "
+                "anniversary month; see the payment schedule.",
+                ", ".join(not_due.mapped('display_name')),
+            ))
+        invoices = self._find_month_invoices(today)
+        missing = self.filtered(lambda c: not invoices[c.id])
+        created = missing._create_month_invoices(today)
+        invoices.update(created)
+        missing._apply_prepayment_to_invoices(created)  # keep your prepayment consumption
+        moves = self.env['account.move'].union(*(invoices[rec.id] for rec in self))
+
+        if len(moves) == 1:
+            # Open the single created invoice in FORM view
+            form_view = self.env.ref('account.view_move_form', raise_if_not_found=False)
+            return {
+                'type': 'ir.actions.act_window',
+                'name': _('Customer Invoice'),
+                'res_model': 'account.move',
+                'res_id': moves.id,
+                'view_mode': 'form',
+                'views': [(form_view.id, 'form')] if form_view else [(False, 'form')],
+                'target': 'current',
+                'context': {'default_move_type': 'out_invoice'},
+            }
+        # Otherwise show the list of all created invoices (your current behavior)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Invoices'),
+            'res_model': 'account.move',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', moves.ids)],
+            'context': {'default_move_type': 'out_invoice'},
+        }
+    
+    def _compute_invoice_count(self):
+        # one grouped count for the whole recordset instead of a search_count per contract
+        groups = self.env['account.move']._read_group([
+            ('move_type', '=', 'out_invoice'),
+            ('partner_id', 'in', self.partner_id.ids),
+            ('x_building_id', 'in', self.building_id.ids),
+            ('x_unit_id', 'in', self.unit_id.ids),
+        ], ['partner_id', 'x_building_id', 'x_unit_id'], ['__count'])
+        counts = {(partner.id, building.id, unit.id): count for partner, building, unit, count in groups}
+        for rec in self:
+            rec.invoice_count = counts.get((rec.partner_id.id, rec.building_id.id, rec.unit_id.id), 0)
+
+    def action_view_invoices(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Invoices'),
+            'res_model': 'account.move',
+            'view_mode': 'list,form',
+            'domain': [
+                ('move_type', '=', 'out_invoice'),
+                ('partner_id', '=', self.partner_id.id),
+                ('x_building_id', '=', self.building_id.id),
+                ('x_unit_id', '=', self.unit_id.id),
+            ],
+        }
+
+
+    @api.constrains('rent_due_day')
+    def _check_rent_due_day(self):
+        for rec in self:
+            if not (1 <= rec.rent_due_day <= 31):
+                raise ValidationError(_("Rent Due Day must be between 1 and 31."))
+
+    # === DUE DATES ===
+    def _due_date_in_month(self, day):
+        """Due date of this contract in the month of 'day' (a due day of 29..31 is clamped to the month end)."""
+        self.ensure_one()
+        last_day = calendar.monthrange(day.year, day.month)[1]
+        return day.replace(day=min(self.rent_due_day or 1, last_day))
+
+    def _period_months(self):
+        """Length of one billing period in months."""
+        self.ensure_one()
+        return 12 if self.recurrence == 'year' else 1
+
+    def _next_due_on_or_after(self, day):
+        """First due date >= day; yearly contracts are due in the anniversary month of start_date."""
+        self.ensure_one()
+        step = self._period_months()
+        months = (day.year - self.start_date.year) * 12 + day.month - self.start_date.month
+        periods = max(-(-months // step), 0)
+        due = self._due_date_in_month(self.start_date + relativedelta(months=periods * step))
+        if due < day:
+            due = self._due_date_in_month(self.start_date + relativedelta(months=(periods + 1) * step))
+        return due
+
+    def _get_period_bounds(self, due_date):
+        """(period_start, period_end, months) of the period billed on due_date: it runs to the next
+        regular due date, so a due date off the yearly anniversary (contracts billed monthly before
+        yearly billing, recurrence changes) is a shorter stub period."""
+        self.ensure_one()
+        period_start = due_date.replace(day=1)
+        next_start = self._next_due_on_or_after(period_start + relativedelta(months=1)).replace(day=1)
+        months = (next_start.year - period_start.year) * 12 + next_start.month - period_start.month
+        return period_start, next_start - relativedelta(days=1), months
+
+    def _get_period_amount(self, due_date):
+        """Rent billed on due_date: the contract amount, pro-rated for a stub period."""
+        self.ensure_one()
+        step = self._period_months()
+        months = self._get_period_bounds(due_date)[2]
+        return self.amount if months >= step else self.amount * months / step
+
+    def _is_due_in_month(self, day):
+        """Whether the month of 'day' is a billing period of this contract."""
+        self.ensure_one()
+        month = day.replace(day=1)
+        if self.next_due_date and self.next_due_date.replace(day=1) == month:
+            return True
+        return self._next_due_on_or_after(month).replace(day=1) == month
+
+    @api.depends('start_date', 'end_date', 'rent_due_day', 'recurrence', 'last_due_activity_date')
+    def _compute_next_due_date(self):
+        today = fields.Date.context_today(self)
+        for rec in self:
+            if not rec.start_date:
+                rec.next_due_date = False
+                continue
+            # never back-bill: start from today (or the day after the last processed run)
+            anchor = max(rec.start_date, today)
+            if rec.last_due_activity_date and rec.last_due_activity_date >= anchor:
+                anchor = rec.last_due_activity_date + relativedelta(days=1)
+            due = rec._next_due_on_or_after(anchor)
+            rec.next_due_date = due if not (rec.end_date and due > rec.end_date) else False
+
+    def _advance_next_due_date(self, vals=None):
+        """Move next_due_date one period (month or year) forward; cleared once it passes end_date.
+
+        ``vals`` are written together with it: a last_due_activity_date stamp written on its own would
+        recompute next_due_date from today instead of advancing it by one period."""
+        # group by target date so the whole batch is written with a handful of UPDATEs
+        ids_by_date = defaultdict(list)
+        for rec in self.filtered('next_due_date'):
+            # the next regular due date (after a stub period, the anniversary)
+            due = rec._next_due_on_or_after(rec.next_due_date.replace(day=1) + relativedelta(months=1))
+            if rec.end_date and due > rec.end_date:
+                due = False
+            ids_by_date[due].append(rec.id)
+        for due, ids in ids_by_date.items():
+            self.browse(ids).write(dict(vals or {}, next_due_date=due))
+
+    @api.model
+    def _get_due_contracts_domain(self, today):
+        """Contracts with an unprocessed due date on or before today (catches up on missed runs)."""
+        return [
+            ('state', '=', 'active'),
+            ('next_due_date', '<=', today),
+        ]
+
+    # === CRON SHARDING ===
+    @api.model
+    def _cron_auto_commit(self):
+        """Crons commit per batch/shard, except inside tests."""
+        return not getattr(threading.current_thread(), 'testing', False)
+
+    @api.model
+    def _get_cron_batch_size(self):
+        """Number of contracts handled (and committed) together by the rent crons."""
+        size = self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.cron_batch_size', 500)
+        return max(int(size), 1)
+
+    @api.model
+    def _get_cron_shard_count(self):
+        """Number of partitions of a rent cron run (1 = unsharded, a single worker handles everything)."""
+        count = self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.cron_shard_count', 1)
+        return max(int(count), 1)
+
+    @api.model
+    def _get_shard_domain(self, shard_index, shard_count):
+        """Contracts of one shard: buildings are partitioned by id modulo shard_count."""
+        self.env.cr.execute(
+            "SELECT id FROM estate_building WHERE id %% %s = %s",
+            [shard_count, shard_index],
+        )
+        return [('building_id', 'in', [row[0] for row in self.env.cr.fetchall()])]
+
+    @api.model
+    def _run_cron_job(self, job, process):
+        """Run a rent cron job, sharded when estate_rent_mgmt.cron_shard_count > 1.
+
+        ``process(today, extra_domain, shard, run)`` handles the due contracts matching extra_domain
+        and reports into ``run`` (rent.cron.run).
+        In sharded mode every worker running the job keeps claiming free shards until none is left,
+        so activating more worker crons bills the portfolio in parallel."""
+        today = fields.Date.context_today(self)
+        shard_count = self._get_cron_shard_count()
+        if shard_count <= 1:
+            return self._run_instrumented(job, process, today)
+
+        Shard = self.env['rent.cron.shard'].sudo()
+        auto_commit = self._cron_auto_commit()
+        Shard._ensure_shards(job, shard_count)
+        if auto_commit:
+            self.env.cr.commit()
+        while True:
+            shard = Shard._claim(job, shard_count, today)
+            if not shard:
+                break
+            if auto_commit:
+                # publish the claim before the (long) processing starts
+                self.env.cr.commit()
+            self._run_instrumented(job, process, today, self._get_shard_domain(shard.shard_index, shard_count), shard)
+            shard._mark_done()
+            if auto_commit:
+                self.env.cr.commit()
+
+    @api.model
+    def _run_instrumented(self, job, process, today, extra_domain=(), shard=None):
+        """Call ``process(today, extra_domain, shard, run)`` and record it as a rent.cron.run."""
+        run = self.env['rent.cron.run']._start(job, today, shard)
+        auto_commit = self._cron_auto_commit()
+        if auto_commit:
+            # the run is visible (state running) while it is processed
+            self.env.cr.commit()
+        try:
+            if auto_commit:
+                process(today, extra_domain, shard, run)
+            else:
+                # nothing is committed (manual run, tests): the savepoint keeps the run record out
+                # of the failing work, so it can still be marked failed
+                with self.env.cr.savepoint():
+                    process(today, extra_domain, shard, run)
+        except Exception as e:
+            if auto_commit:
+                self.env.cr.rollback()
+            else:
+                self.env.transaction.clear()
+            run._finish(error=str(e))
+            if auto_commit:
+                self.env.cr.commit()
+            raise
+        run._finish()
+
+    def _run_batch(self, method, today, run):
+        """Call ``method(today, run)`` on the batch inside a savepoint and return the contracts that failed.
+
+        When the batch fails (or when the run profiles its slowest contracts) the batch is redone
+        contract by contract, each in its own savepoint, so that one bad contract only costs itself."""
+        if not run._profile_size():
+            try:
+                with self.env.cr.savepoint():
+                    getattr(self, method)(today, run)
+                return self.browse()
+            except Exception:
+                _logger.warning("Rent cron batch failed, retrying contract by contract", exc_info=True)
+                # forget what the failed batch left in cache
+                self.env.transaction.clear()
+
+        failed = self.browse()
+        timings = []
+        for contract in self:
+            wall, queries = time.perf_counter(), self.env.cr.sql_log_count
+            try:
+                with self.env.cr.savepoint():
+                    getattr(contract, method)(today, run)
+            except Exception as e:
+                self.env.transaction.clear()
+                failed |= contract
+                run._log_error(contract, str(e))
+            else:
+                timings.append((contract.id, time.perf_counter() - wall, self.env.cr.sql_log_count - queries))
+        run._record_profile(timings)
+        return failed
+
+    # === CRON ENTRYPOINT ===
+    @api.model
+    def cron_create_rent_due_activities(self):
+        self._run_cron_job('reminders', self._create_rent_due_activities)
+
+    @api.model
+    def cron_create_rent_due_activities_worker(self):
+        """Extra worker: only joins sharded runs, the main cron handles unsharded ones alone."""
+        if self._get_cron_shard_count() > 1:
+            self.cron_create_rent_due_activities()
+
+    @api.model
+    def _create_rent_due_activities(self, today, extra_domain=(), shard=None, run=None):
+        run = run or self.env['rent.cron.run']
+        domain = self._get_due_contracts_domain(today) + list(extra_domain)
+        with run._phase('select'):
+            # not reminded yet for their current due date
+            query = self._search(domain)
+            query.add_where(SQL(
+                "(%(table)s.last_reminder_date IS NULL OR %(table)s.last_reminder_date < %(table)s.next_due_date)",
+                table=SQL.identifier(query.table),
+            ))
+            contracts = self.browse(query.get_result_ids())
+        if not contracts:
+            return
+
+        auto_commit = self._cron_auto_commit()
+        for batch in split_every(self._get_cron_batch_size(), contracts.ids, self.browse):
+            if shard:
+                # renew the lease before the batch runs, so a slow batch is not re-claimed meanwhile
+                shard._heartbeat()
+                if auto_commit:
+                    self.env.cr.commit()
+            started = time.perf_counter()
+            run._add(contracts_selected=len(batch))
+            batch._run_batch('_create_due_activities_batch', today, run)
+            run._batch_done(time.perf_counter() - started)
+            if auto_commit:
+                self.env.cr.commit()
+
+    def _create_due_activities_batch(self, today, run=None):
+        run = run or self.env['rent.cron.run']
+        todo_type = self.env.ref('mail.mail_activity_data_todo')
+        with run._phase('notify'):
+            # billing may already have opened the activity of this due date
+            open_activities = self._get_open_due_activities(todo_type)
+            activity_vals_list = []
+            for c in self:
+                if c.id in open_activities:
+                    continue
+                # amount due for this period (a month, a year, or a pro-rated stub)
+                period_due = c._get_period_amount(c.next_due_date)
+                # available prepayment
+                prepay_bal = c._get_prepayment_balance() if hasattr(c, '_get_prepayment_balance') else 0.0
+
+                if prepay_bal >= period_due:
+                    # Option 1: no activity (quiet mode), the date is stamped below so this due date is not checked again
+                    # Option 2: create an FYI activity instead of skipping:
+                    # activity_vals_list.append(c._prepare_due_activity_vals(
+                    #     todo_type, today,
+                    #     _('Rent covered by advance payment'),
+                    #     _('This month’s rent is fully covered by prepayment. Balance: %.2f') % prepay_bal,
+                    # ))
+                    continue
+
+                # Not fully covered → create the usual reminder
+                activity_vals_list.append(c._prepare_due_activity_vals(
+                    todo_type, today,
+                    _('Pay Rent'),
+                    _('Rent is due today for %s — %s / %s.') % (
+                        c.partner_id.display_name, c.building_id.name or '',
+                        (c.unit_id.unit_number or c.unit_id.display_name or '')
+                    ),
+                ))
+
+            # one INSERT batch for all reminders, one UPDATE for the stamp (system field: no tracking)
+            if activity_vals_list:
+                self.env['mail.activity'].create(activity_vals_list)
+            self.with_context(tracking_disable=True).write({'last_reminder_date': today})
+        run._add(activities_scheduled=len(activity_vals_list))
+
+    def _get_open_due_activities(self, activity_type):
+        """{contract id: open automated activity of ``activity_type``} of the contracts in self (one search)."""
+        activities = self.env['mail.activity'].search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('activity_type_id', '=', activity_type.id),
+            ('automated', '=', True),
+        ])
+        return {activity.res_id: activity for activity in activities}
+
+    def _prepare_due_activity_vals(self, activity_type, date_deadline, summary, note):
+        """Values of a reminder activity on this contract, for a bulk mail.activity create()
+        (same result as activity_schedule without the per-record overhead)."""
+        self.ensure_one()
+        return {
+            'res_model_id': self.env['ir.model']._get_id(self._name),
+            'res_id': self.id,
+            'automated': True,
+            'activity_type_id': activity_type.id,
+            'date_deadline': date_deadline,
+            'user_id': self.responsible_id.id or self.env.user.id,
+            'summary': summary,
+            'note': note,
+        }
+
+    @api.depends('unit_id', 'unit_id.effective_owner_id')
+    def _compute_owner(self):
+        for rec in self:
+            if rec.owner_id and rec.state in ('expired', 'cancelled'):
+                # closed contracts keep the owner they ran under (owner transfers, statements)
+                rec.owner_id = rec.owner_id
+            else:
+                rec.owner_id = rec.unit_id.effective_owner_id
+    
+    def _get_tenant_partner(self):
+        self.ensure_one()
+        for fname in ('partner_id', 'tenant_id', 'tenant_partner_id', 'x_tenant_partner_id', 'customer_id'):
+            if fname in self._fields and getattr(self, fname):
+                return getattr(self, fname)
+        raise UserError(_("Please set a tenant/customer on this contract."))
+
+    def action_create_prepayment_invoice(self):
+        self.ensure_one()
+        partner = self._get_tenant_partner()
+
+        # default to the monthly charge
+        monthly_price = self.amount if self.recurrence == 'month' else (self.amount / 12.0)
+
+        move = self.env['account.move'].create({
+            'move_type': 'out_invoice',
+            'partner_id': partner.id,
+            'invoice_origin': self.name or _('Rent Contract'),
+            'company_id': self.company_id.id,
+            'currency_id': self.currency_id.id,
+            'invoice_date': fields.Date.context_today(self),
+            'contract_id': self.id,
+            'rent_kind': 'prepayment',
+
+            'x_building_id': self.building_id.id,
+            'x_unit_id': self.unit_id.id,
+            'x_floor': self.unit_id.floor,
+            'x_unit_number': self.unit_id.unit_number,
+            'x_owner_id': self.owner_id.id,
+
+            'invoice_line_ids': [(0, 0, {
+                'name': _('Rent Prepayment for %s') % (self.name or ''),
+                'quantity': 1.0,
+                'price_unit': monthly_price,   
+            })],
+        })
+
+        if hasattr(move, '_onchange_invoice_line_ids'):
+            move._onchange_invoice_line_ids()
+
+        # create the linked prepayment so it shows in the O2M immediately
+        self.env['rent.prepayment'].create({
+            'contract_id': self.id,
+            'date': fields.Date.context_today(self),
+            'months': 1,                                  
+            'amount': abs(move.amount_total),              
+            'currency_id': self.currency_id.id,
+            'description': _('Advance payment'),
+            'move_id': move.id,                           
+        })
+
+        form_view = self.env.ref('account.view_move_form', raise_if_not_found=False)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Customer Invoice'),
+            'res_model': 'account.move',
+            'res_id': move.id,
+            'view_mode': 'form',
+            'views': [(form_view.id, 'form')] if form_view else [(False, 'form')],
+            'target': 'current',
+            'context': {'default_move_type': 'out_invoice'},
+        }
+
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        ctx = self.env.context
+        unit = False
+
+        if ctx.get('default_unit_id'):
+            unit = self.env['estate.building.unit'].browse(ctx['default_unit_id'])
+        elif ctx.get('active_model') == 'estate.building.unit' and ctx.get('active_id'):
+            unit = self.env['estate.building.unit'].browse(ctx['active_id'])
+
+        if unit:
+            # unit & building
+            if 'unit_id' in fields_list and not res.get('unit_id'):
+                res['unit_id'] = unit.id
+            if 'building_id' in fields_list and not res.get('building_id'):
+                res['building_id'] = unit.building_id.id
+
+            # tenant (if there is a current tenant on the unit)
+            if 'partner_id' in fields_list and not res.get('partner_id') and unit.tenant_id:
+                res['partner_id'] = unit.tenant_id.id
+
+            # company (from building if set)
+            if 'company_id' in fields_list and not res.get('company_id') and unit.building_id.company_id:
+                res['company_id'] = unit.building_id.company_id.id
+
+            # start date today
+            if 'start_date' in fields_list and not res.get('start_date'):
+                res['start_date'] = fields.Date.context_today(self)
+
+        return res
+
+    # --- when user picks a unit manually, auto-fill building & tenant too ---
+    @api.onchange('unit_id')
+    def _onchange_unit_id_fill_from_unit(self):
+        for rec in self:
+            if rec.unit_id:
+                rec.building_id = rec.unit_id.building_id
+                if not rec.partner_id and rec.unit_id.tenant_id:
                     rec.partner_id = rec.unit_id.tenant_id
\ No newline at end of file
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.tools.sql import create_index
+
+
+class RentContractSchedule(models.Model):
+    """One billing period of a contract: what is due, covered by prepayments, invoiced and paid.
+
+    Lines are generated ahead of time in a rolling window (``cron_extend_schedules``) and linked to
+    the period invoice when it is created, so "what is due / unpaid for period X" is an indexed
+    lookup on this table instead of a date-range scan of the invoices."""
+    _name = 'rent.contract.schedule'
+    _description = 'Rent Contract Payment Schedule'
+    _order = 'contract_id, due_date'
+
+    contract_id = fields.Many2one('rent.contract', string='العقد', required=True, ondelete='cascade', index=True)
+    company_id = fields.Many2one(related='contract_id.company_id', store=True)
+    building_id = fields.Many2one(related='contract_id.building_id', store=True)
+    partner_id = fields.Many2one(related='contract_id.partner_id', store=True)
+    currency_id = fields.Many2one(related='contract_id.currency_id', store=True)
+    period_start = fields.Date(string='Period Start', required=True, readonly=True,
+                               help="Billing period key of the period invoice (first day of the due month).")
+    period_end = fields.Date(string='Period End', readonly=True)
+    due_date = fields.Date(string='Due Date', required=True, readonly=True)
+    amount = fields.Monetary(string='Amount Due', readonly=True)
+    covered_amount = fields.Monetary(string='Covered by Prepayments', readonly=True)
+    invoice_id = fields.Many2one('account.move', string='Invoice', readonly=True, index='btree_not_null',
+                                 ondelete='set null')
+    payment_state = fields.Selection(related='invoice_id.payment_state', store=True, string='Payment Status')
+    state = fields.Selection([
+        ('pending', 'Not Invoiced'),
+        ('invoiced', 'Invoiced'),
+        ('paid', 'Paid'),
+    ], compute='_compute_state', store=True, index=True)
+
+    _sql_constraints = [
+        ('contract_period_uniq', 'unique(contract_id, period_start)',
+         'A contract has only one schedule line per billing period.'),
+    ]
+
+    _rent_indexes = [
+        # arrears / upcoming dues: state = ... AND due_date <= ...
+        ('rent_contract_schedule_state_due_idx', ['state', 'due_date'], None),
+    ]
+
+    def init(self):
+        super().init()
+        for indexname, expressions, where in self._rent_indexes:
+            create_index(self.env.cr, indexname, self._table, expressions, where=where)
+
+    @api.depends('invoice_id.state', 'payment_state')
+    def _compute_state(self):
+        for line in self:
+            if not line.invoice_id or line.invoice_id.state == 'cancel':
+                line.state = 'pending'
+            elif line.payment_state in ('paid', 'in_payment', 'reversed'):
+                line.state = 'paid'
+            else:
+                line.state = 'invoiced'
+
+
+class RentContract(models.Model):
+    _inherit = 'rent.contract'
+
+    # changing one of these regenerates the pending schedule lines
+    _schedule_terms = ('amount', 'recurrence', 'rent_due_day', 'start_date', 'end_date', 'state')
+
+    schedule_ids = fields.One2many('rent.contract.schedule', 'contract_id', string='Payment Schedule')
+    schedule_until = fields.Date(
+        string='Schedule Generated Until', readonly=True, copy=False,
+        help="Schedule lines exist for every due date up to this date.")
+
+    def write(self, vals):
+        res = super().write(vals)
+        if any(fname in vals for fname in self._schedule_terms):
+            self._reset_schedules()
+        return res
+
+    @api.model
+    def _get_schedule_horizon(self, today):
+        months = int(self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.schedule_window_months', 3))
+        return today + relativedelta(months=max(months, 0))
+
+    def _extend_schedules(self, until):
+        """Generate the missing schedule lines of self up to ``until`` with a single create().
+
+        Generation starts after schedule_until, or at next_due_date for a contract without
+        schedule yet (past periods are not back-filled)."""
+        Schedule = self.env['rent.contract.schedule']
+        todo = {}
+        for c in self:
+            if c.state != 'active' or not c.start_date:
+                continue
+            if c.schedule_until:
+                first = c._next_due_on_or_after(c.schedule_until + relativedelta(days=1))
+            elif c.next_due_date:
+                first = c.next_due_date
+            else:
+                continue
+            todo[c] = first
+        vals_list = []
+        if todo:
+            existing = {
+                (line.contract_id.id, line.period_start)
+                for line in Schedule.search([
+                    ('contract_id', 'in', [c.id for c in todo]),
+                    ('period_start', '>=', self._get_billing_period(min(todo.values()))),
+                ])
+            }
+            for c, due in todo.items():
+                last = min(until, c.end_date) if c.end_date else until
+                while due <= last:
+                    period_start = c._get_billing_period(due)
+                    if (c.id, period_start) not in existing:
+                        vals_list.append(c._prepare_schedule_vals(due))
+                    due = c._next_due_on_or_after(period_start + relativedelta(months=1))
+        # the horizon is recorded even when the contract ends before it, so it is not selected again
+        if self:
+            self.write({'schedule_until': until})
+        return Schedule.create(vals_list)
+
+    def _prepare_schedule_vals(self, due_date, invoice=None):
+        self.ensure_one()
+        period_start, period_end, _months = self._get_period_bounds(due_date)
+        return {
+            'contract_id': self.id,
+            'period_start': period_start,
+            'period_end': period_end,
+            'due_date': due_date,
+            'amount': self._get_period_amount(due_date),
+            'invoice_id': invoice.id if invoice else False,
+        }
+
+    def _reset_schedules(self):
+        """Drop the not-yet-invoiced lines and regenerate them from the current terms."""
+        self.env['rent.contract.schedule'].search([
+            ('contract_id', 'in', self.ids),
+            ('state', '=', 'pending'),
+        ]).unlink()
+        active = self.filtered(lambda c: c.state == 'active')
+        (self - active).filtered('schedule_until').write({'schedule_until': False})
+        if active:
+            active.write({'schedule_until': False})
+            active._extend_schedules(self._get_schedule_horizon(fields.Date.context_today(self)))
+
+    @api.model
+    def cron_extend_schedules(self):
+        """Daily: generate the schedule lines of the active contracts up to the rolling window
+        (estate_rent_mgmt.schedule_window_months, default 3), one create per batch."""
+        today = fields.Date.context_today(self)
+        until = self._get_schedule_horizon(today)
+        domain = [
+            ('state', '=', 'active'),
+            ('next_due_date', '!=', False),
+            '|', ('schedule_until', '=', False), ('schedule_until', '<', until),
+        ]
+        batch_size = self._get_cron_batch_size()
+        auto_commit = self._cron_auto_commit()
+        contracts = self.with_context(tracking_disable=True)
+        while True:
+            batch = contracts.search(domain, order='id', limit=batch_size)
+            if not batch:
+                break
+            batch._extend_schedules(until)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+    # ------------------------------------------------------------------ billing hooks
+    def _create_month_invoices(self, on_date):
+        """Link the new period invoices to their schedule line (created if the window did not reach it)."""
+        invoices = super()._create_month_invoices(on_date)
+        Schedule = self.env['rent.contract.schedule']
+        period = self._get_billing_period(on_date)
+        lines = Schedule.search([('contract_id', 'in', self.ids), ('period_start', '=', period)])
+        ids_by_invoice = defaultdict(list)
+        for line in lines:
+            ids_by_invoice[invoices[line.contract_id.id]].append(line.id)
+        for invoice, line_ids in ids_by_invoice.items():
+            Schedule.browse(line_ids).write({'invoice_id': invoice.id})
+        scheduled = set(lines.contract_id.ids)
+        Schedule.create([
+            c._prepare_schedule_vals(on_date, invoices[c.id]) for c in self if c.id not in scheduled
+        ])
+        return invoices
+
+    @api.model
+    def _allocate_prepayments(self, requests):
+        """Add the consumed prepayments to the covered amount of the invoices' schedule lines."""
+        consumptions = super()._allocate_prepayments(requests)
+        covered = defaultdict(float)
+        for consumption in consumptions:
+            covered[consumption.invoice_id.id] += consumption.amount
+        if covered:
+            for line in self.env['rent.contract.schedule'].search([('invoice_id', 'in', list(covered))]):
+                line.covered_amount += covered[line.invoice_id.id]
+        return consumptions
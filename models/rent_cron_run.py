@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import time
+from contextlib import contextmanager
+
+from odoo import api, fields, models
+
+PHASES = ('select', 'invoice', 'allocate', 'notify')
+
+
+class RentCronRun(models.Model):
+    """One execution of a rent cron job (one shard in sharded mode).
+
+    Counters and per-phase timings are accumulated in cache and written together with each
+    committed batch, so the instrumentation costs one UPDATE per batch. An empty ``rent.cron.run``
+    recordset is a valid "no instrumentation" run: all helpers are then no-ops."""
+    _name = 'rent.cron.run'
+    _description = 'Rent Cron Run'
+    _order = 'id desc'
+
+    job = fields.Selection([
+        ('reminders', 'Due Reminders'),
+        ('billing', 'Auto-invoice & Prepayments'),
+    ], required=True, readonly=True)
+    run_date = fields.Date(readonly=True)
+    shard_index = fields.Integer(readonly=True)
+    shard_count = fields.Integer(readonly=True, default=1)
+    state = fields.Selection([
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('partial', 'Done with Errors'),
+        ('failed', 'Failed'),
+    ], default='running', required=True, readonly=True)
+    date_start = fields.Datetime(readonly=True)
+    date_end = fields.Datetime(readonly=True)
+    message = fields.Text(readonly=True)
+
+    contracts_selected = fields.Integer(readonly=True)
+    invoices_created = fields.Integer(readonly=True)
+    consumptions_written = fields.Integer(readonly=True)
+    activities_scheduled = fields.Integer(readonly=True)
+    batch_count = fields.Integer(readonly=True)
+    query_count = fields.Integer(string='SQL Queries', readonly=True)
+    query_base = fields.Integer(readonly=True)
+
+    wall_time = fields.Float(string='Wall Time (s)', readonly=True)
+    select_wall = fields.Float(string='Select Wall (s)', readonly=True)
+    select_cpu = fields.Float(string='Select CPU (s)', readonly=True)
+    invoice_wall = fields.Float(string='Invoice Wall (s)', readonly=True)
+    invoice_cpu = fields.Float(string='Invoice CPU (s)', readonly=True)
+    allocate_wall = fields.Float(string='Allocate Wall (s)', readonly=True)
+    allocate_cpu = fields.Float(string='Allocate CPU (s)', readonly=True)
+    notify_wall = fields.Float(string='Notify Wall (s)', readonly=True)
+    notify_cpu = fields.Float(string='Notify CPU (s)', readonly=True)
+    slowest_batch_wall = fields.Float(string='Slowest Batch (s)', readonly=True)
+
+    error_ids = fields.One2many('rent.cron.run.error', 'run_id', string='Errors', readonly=True)
+    error_count = fields.Integer(readonly=True)
+    profile_ids = fields.One2many('rent.cron.run.profile', 'run_id', string='Slowest Contracts', readonly=True)
+
+    @api.model
+    def _start(self, job, run_date, shard=None):
+        return self.sudo().create({
+            'job': job,
+            'run_date': run_date,
+            'shard_index': shard.shard_index if shard else 0,
+            'shard_count': shard.shard_count if shard else 1,
+            'date_start': fields.Datetime.now(),
+            'query_base': self.env.cr.sql_log_count,
+        })
+
+    @contextmanager
+    def _phase(self, name):
+        """Add the wall/CPU time of the block to phase ``name`` (one of PHASES)."""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            if self:
+                self[f'{name}_wall'] += time.perf_counter() - wall
+                self[f'{name}_cpu'] += time.thread_time() - cpu
+
+    def _add(self, **counters):
+        if self:
+            for fname, value in counters.items():
+                self[fname] += value
+
+    def _batch_done(self, wall):
+        """Called once per batch, right before its commit."""
+        if self:
+            self.batch_count += 1
+            self.slowest_batch_wall = max(self.slowest_batch_wall, wall)
+            self.query_count = self.env.cr.sql_log_count - self.query_base
+            self.wall_time = (fields.Datetime.now() - self.date_start).total_seconds()
+
+    def _log_error(self, contract, message):
+        if self:
+            self.env['rent.cron.run.error'].sudo().create({
+                'run_id': self.id,
+                'contract_id': contract.id,
+                'message': message,
+            })
+            self.error_count += 1
+
+    def _profile_size(self):
+        """Number of slowest contracts to profile (system parameter estate_rent_mgmt.cron_profile_slowest).
+
+        When set, batches are processed contract by contract so each contract can be timed: meant
+        for diagnosing a slow run, not for the nightly schedule."""
+        if not self:
+            return 0
+        return int(self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.cron_profile_slowest', 0))
+
+    def _record_profile(self, timings):
+        """Keep the slowest contracts of the run; ``timings`` is a list of (contract_id, wall, queries)."""
+        size = self._profile_size()
+        if not size or not timings:
+            return
+        Profile = self.env['rent.cron.run.profile'].sudo()
+        current = [(p.contract_id.id, p.wall_time, p.query_count) for p in self.profile_ids]
+        slowest = sorted(current + timings, key=lambda t: t[1], reverse=True)[:size]
+        self.profile_ids.unlink()
+        Profile.create([{
+            'run_id': self.id,
+            'contract_id': contract_id,
+            'wall_time': wall,
+            'query_count': queries,
+        } for contract_id, wall, queries in slowest])
+
+    def _finish(self, error=None):
+        if not self:
+            return
+        self._batch_done(0.0)
+        self.write({
+            'date_end': fields.Datetime.now(),
+            'state': 'failed' if error else ('partial' if self.error_count else 'done'),
+            'message': error or False,
+        })
+
+    @api.autovacuum
+    def _gc_cron_runs(self):
+        """Keep the run history bounded (estate_rent_mgmt.cron_run_retention_days, default 90)."""
+        days = int(self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.cron_run_retention_days', 90))
+        limit = fields.Datetime.subtract(fields.Datetime.now(), days=days)
+        self.sudo().search([('date_start', '<', limit)]).unlink()
+
+
+class RentCronRunError(models.Model):
+    _name = 'rent.cron.run.error'
+    _description = 'Rent Cron Run - Contract Error'
+    _order = 'run_id desc, id'
+
+    run_id = fields.Many2one('rent.cron.run', required=True, ondelete='cascade', index=True)
+    contract_id = fields.Many2one('rent.contract', string='العقد', ondelete='cascade', index=True)
+    message = fields.Text(required=True)
+
+
+class RentCronRunProfile(models.Model):
+    _name = 'rent.cron.run.profile'
+    _description = 'Rent Cron Run - Slow Contract'
+    _order = 'run_id desc, wall_time desc'
+
+    run_id = fields.Many2one('rent.cron.run', required=True, ondelete='cascade', index=True)
+    contract_id = fields.Many2one('rent.contract', string='العقد', ondelete='cascade')
+    wall_time = fields.Float(string='Wall Time (s)', digits=(16, 4))
+    query_count = fields.Integer(string='SQL Queries')
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import api, fields, models
+
+
+class RentCronShard(models.Model):
+    """One partition of a sharded rent cron run.
+
+    Shards are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several cron
+    workers can process the due contracts of the same day in parallel without
+    ever picking the same partition twice."""
+    _name = 'rent.cron.shard'
+    _description = 'Rent Cron Shard'
+    _order = 'job, shard_count, shard_index'
+
+    job = fields.Selection([
+        ('reminders', 'Due Reminders'),
+        ('billing', 'Auto-invoice & Prepayments'),
+    ], required=True)
+    shard_count = fields.Integer(required=True)
+    shard_index = fields.Integer(required=True)
+    run_date = fields.Date(string='Last Run', readonly=True)
+    done = fields.Boolean(readonly=True)
+    claimed_at = fields.Datetime(string='Claimed / Heartbeat', readonly=True)
+
+    _sql_constraints = [
+        ('shard_unique', 'unique(job, shard_count, shard_index)', 'Each shard can only exist once per job.'),
+    ]
+
+    @api.model
+    def _get_lease_minutes(self):
+        """A running shard without heartbeat for this long is considered abandoned and can be re-claimed.
+
+        The lease is renewed before every batch: it must exceed the time of the slowest batch."""
+        return int(self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.cron_shard_lease_minutes', 30))
+
+    @api.model
+    def _ensure_shards(self, job, shard_count):
+        """Create the shard rows of (job, shard_count); safe when several workers start together."""
+        self.env.cr.execute("""
+            INSERT INTO rent_cron_shard (job, shard_count, shard_index, done,
+                                         create_uid, create_date, write_uid, write_date)
+            SELECT %(job)s, %(count)s, i, false,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM generate_series(0, %(count)s - 1) AS i
+            ON CONFLICT (job, shard_count, shard_index) DO NOTHING
+        """, {'job': job, 'count': shard_count, 'uid': self.env.uid})
+
+    @api.model
+    def _claim(self, job, shard_count, today):
+        """Claim the next shard not yet processed today; returns an empty recordset when none is left."""
+        lease_limit = fields.Datetime.now() - timedelta(minutes=self._get_lease_minutes())
+        self.env.cr.execute("""
+            SELECT id FROM rent_cron_shard
+             WHERE job = %(job)s AND shard_count = %(count)s
+               AND (run_date IS NULL OR run_date < %(today)s
+                    OR (NOT done AND (claimed_at IS NULL OR claimed_at < %(lease)s)))
+             ORDER BY shard_index
+        """, {'job': job, 'count': shard_count, 'today': today, 'lease': lease_limit})
+        for shard_id in [row[0] for row in self.env.cr.fetchall()]:
+            try:
+                with self.env.cr.savepoint():
+                    self.env.cr.execute(
+                        "SELECT id FROM rent_cron_shard WHERE id = %s FOR UPDATE SKIP LOCKED", [shard_id])
+                    if not self.env.cr.fetchone():
+                        # being claimed by another worker right now
+                        continue
+                    self.env.cr.execute("""
+                        UPDATE rent_cron_shard
+                           SET run_date = %s, done = false, claimed_at = now() at time zone 'UTC'
+                         WHERE id = %s
+                    """, [today, shard_id])
+            except psycopg2.errors.SerializationFailure:
+                # claimed by another worker after our snapshot: try the next shard
+                continue
+            self.invalidate_model(['run_date', 'done', 'claimed_at'])
+            return self.browse(shard_id)
+        return self.browse()
+
+    def _heartbeat(self):
+        """Refresh the lease of a running shard (called, and committed, before every batch)."""
+        self.env.cr.execute(
+            "UPDATE rent_cron_shard SET claimed_at = now() at time zone 'UTC' WHERE id IN %s",
+            [tuple(self.ids)],
+        )
+        self.invalidate_recordset(['claimed_at'])
+
+    def _mark_done(self):
+        self.env.cr.execute("UPDATE rent_cron_shard SET done = true WHERE id IN %s", [tuple(self.ids)])
+        self.invalidate_recordset(['done'])
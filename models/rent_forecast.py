@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+import psycopg2
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools.sql import create_index, index_exists
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def _month_start(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class RentForecastLine(models.Model):
+    """Projected rent income per company, building, owner, currency and month.
+
+    Lines are a cache: they are computed once per company and day (see ``_ensure_forecast``)
+    from the active contracts' terms and the prepayment balances covering future months."""
+    _name = 'rent.forecast.line'
+    _description = 'Rent Cash-Flow Forecast'
+    _order = 'month, building_id'
+
+    company_id = fields.Many2one('res.company', string='الشركة', required=True, readonly=True)
+    forecast_date = fields.Date(string='Computed On', required=True, readonly=True)
+    horizon = fields.Integer(string='Horizon (months)', readonly=True)
+    month = fields.Date(required=True, readonly=True)
+    building_id = fields.Many2one('estate.building', string='البناية', readonly=True)
+    owner_id = fields.Many2one('res.partner', string='Owner / المالك', readonly=True)
+    currency_id = fields.Many2one('res.currency', required=True, readonly=True)
+    amount_due = fields.Monetary(string='Rent Due', readonly=True)
+    amount_covered = fields.Monetary(string='Covered by Prepayments', readonly=True)
+    amount_expected = fields.Monetary(string='Expected Cash-in', readonly=True)
+    # converted at the rate of forecast_date, so lines of several currencies can be totalled
+    company_currency_id = fields.Many2one(related='company_id.currency_id', string='Company Currency')
+    amount_due_company = fields.Monetary(string='Rent Due (Company Currency)', currency_field='company_currency_id',
+                                         readonly=True)
+    amount_expected_company = fields.Monetary(string='Expected Cash-in (Company Currency)',
+                                              currency_field='company_currency_id', readonly=True)
+    contract_count = fields.Integer(string='Contracts', readonly=True)
+
+    _rent_indexes = [
+        ('rent_forecast_line_company_date_idx', ['company_id', 'forecast_date', 'horizon'], None),
+    ]
+
+    def init(self):
+        super().init()
+        for indexname, expressions, where in self._rent_indexes:
+            create_index(self.env.cr, indexname, self._table, expressions, where=where)
+        # one line per key and forecast: a concurrent first build of the same forecast is rejected
+        # (see _ensure_forecast); the lines are a cache, drop any duplicated forecast before
+        if not index_exists(self.env.cr, 'rent_forecast_line_key_uniq'):
+            self.env.cr.execute(f'DELETE FROM "{self._table}"')
+            self.env.cr.execute("""
+                CREATE UNIQUE INDEX rent_forecast_line_key_uniq
+                    ON rent_forecast_line (company_id, forecast_date, horizon, month,
+                                           COALESCE(building_id, 0), COALESCE(owner_id, 0), currency_id)
+            """)
+
+    @api.model
+    def _get_horizon(self, months=None):
+        """Horizon in months (1..120): ``months`` when given (request input, rejected if not a number),
+        else the estate_rent_mgmt.forecast_months setting (36 when unset or invalid)."""
+        if months:
+            try:
+                months = int(months)
+            except (TypeError, ValueError):
+                raise UserError(_("The forecast horizon must be a number of months, not %s.", months)) from None
+        else:
+            try:
+                months = int(self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.forecast_months', 36))
+            except (TypeError, ValueError):
+                months = 36
+        return min(max(months, 1), 120)
+
+    @api.model
+    def _ensure_forecast(self, company, months=None, force=False):
+        """Forecast lines of ``company`` for today, computed at most once per company, day and horizon.
+
+        Rebuilds only replace the lines of their own horizon (plus the stale lines of previous days),
+        so readers of another horizon keep theirs, and are serialized per company with a transaction
+        advisory lock. A rebuild that committed while we waited is not visible to our snapshot:
+        deleting its stale lines fails with a serialization error (the request is retried), and
+        inserting the same lines again is rejected by rent_forecast_line_key_uniq."""
+        horizon = self._get_horizon(months)
+        today = fields.Date.context_today(self)
+        domain = [('company_id', '=', company.id), ('forecast_date', '=', today), ('horizon', '=', horizon)]
+        if not force and self.search_count(domain, limit=1):
+            return self.search(domain)
+        self.env.cr.execute("SELECT pg_advisory_xact_lock(hashtext(%s), %s)", [self._table, company.id])
+        self.sudo().search([
+            ('company_id', '=', company.id),
+            '|', ('forecast_date', '<', today), ('horizon', '=', horizon),
+        ]).unlink()
+        vals_list = self._compute_forecast_vals(company, today, horizon)
+        try:
+            with self.env.cr.savepoint():
+                return self.sudo().create(vals_list).sudo(False)
+        except psycopg2.errors.UniqueViolation:
+            self.env.transaction.clear()
+        # a concurrent first build of this forecast committed its lines first
+        lines = self.search(domain)
+        if not lines:
+            raise UserError(_("The rent forecast is being computed by another user, please try again."))
+        return lines
+
+    # ------------------------------------------------------------------ engine
+    @api.model
+    def _load_contract_terms(self, company):
+        """Terms of the active contracts still to bill, as columns (one list per field), in one query."""
+        Contract = self.env['rent.contract']
+        Contract.flush_model(['company_id', 'state', 'building_id', 'owner_id', 'currency_id', 'amount',
+                              'recurrence', 'end_date', 'next_due_date', 'prepayment_balance'])
+        self.env.cr.execute("""
+            SELECT id, building_id, COALESCE(owner_id, 0), currency_id, amount, recurrence = 'year',
+                   next_due_date, end_date, prepayment_balance
+              FROM rent_contract
+             WHERE company_id = %s AND state = 'active' AND next_due_date IS NOT NULL
+        """, [company.id])
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return None
+        ids, building, owner, currency, amount, yearly, next_due, end, balance = (list(col) for col in zip(*rows))
+        return {
+            'id': ids,
+            'building': building,
+            'owner': owner,
+            'currency': currency,
+            'amount': [a or 0.0 for a in amount],
+            'yearly': yearly,
+            'next_due': next_due,
+            'next_idx': [_month_index(d) for d in next_due],
+            # open-ended contracts run past any horizon
+            'end_idx': [_month_index(d) if d else 10 ** 6 for d in end],
+            'balance': [max(b or 0.0, 0.0) for b in balance],
+        }
+
+    @api.model
+    def _get_period_dues(self, terms, first_idx, horizon):
+        """(rows, month offsets, amounts) of the yearly contracts' periods within the horizon.
+
+        Yearly periods go through the billing helpers (_next_due_on_or_after, _get_period_amount),
+        so a stub period is forecast in the month and for the amount it is invoiced. Monthly
+        periods are always one full month and are projected directly."""
+        rows, cols, amounts = [], [], []
+        yearly_rows = [i for i, yearly in enumerate(terms['yearly']) if yearly]
+        contracts = self.env['rent.contract'].browse([terms['id'][i] for i in yearly_rows])
+        for i, contract in zip(yearly_rows, contracts):
+            last_idx = min(first_idx + horizon - 1, terms['end_idx'][i])
+            due = terms['next_due'][i]
+            while _month_index(due) <= last_idx:
+                if _month_index(due) >= first_idx:
+                    rows.append(i)
+                    cols.append(_month_index(due) - first_idx)
+                    amounts.append(contract._get_period_amount(due))
+                due = contract._next_due_on_or_after(due.replace(day=1) + relativedelta(months=1))
+        return rows, cols, amounts
+
+    @api.model
+    def _project_numpy(self, terms, first_idx, horizon):
+        """(due, covered) contract x month matrices.
+
+        A monthly contract is due every month from its next due month to its end month, a yearly one
+        in the months of terms['period_dues']; prepayment balances cover the earliest months first."""
+        months = first_idx + np.arange(horizon)
+        amount = np.asarray(terms['amount'], dtype=float)
+        yearly = np.asarray(terms['yearly'], dtype=bool)
+        next_idx = np.asarray(terms['next_idx'])
+        end_idx = np.asarray(terms['end_idx'])
+        balance = np.asarray(terms['balance'], dtype=float)
+
+        offset = months[None, :] - next_idx[:, None]
+        active = (offset >= 0) & (months[None, :] <= end_idx[:, None])
+        due = np.where(active & ~yearly[:, None], amount[:, None], 0.0)
+        rows, cols, amounts = terms['period_dues']
+        due[np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)] = amounts
+        covered_cum = np.minimum(np.cumsum(due, axis=1), balance[:, None])
+        covered = np.diff(covered_cum, axis=1, prepend=0.0)
+        return due, covered
+
+    @api.model
+    def _project_python(self, terms, first_idx, horizon):
+        """Same as _project_numpy, without NumPy (slower; lists of lists)."""
+        period_dues = {(row, col): value for row, col, value in zip(*terms['period_dues'])}
+        due, covered = [], []
+        for row, (amount, yearly, next_idx, end_idx, balance) in enumerate(zip(
+            terms['amount'], terms['yearly'], terms['next_idx'], terms['end_idx'], terms['balance'],
+        )):
+            row_due, row_covered = [], []
+            for m, month in enumerate(range(first_idx, first_idx + horizon)):
+                if yearly:
+                    value = period_dues.get((row, m), 0.0)
+                else:
+                    value = amount if next_idx <= month <= end_idx else 0.0
+                cover = min(value, balance)
+                balance -= cover
+                row_due.append(value)
+                row_covered.append(cover)
+            due.append(row_due)
+            covered.append(row_covered)
+        return due, covered
+
+    @api.model
+    def _aggregate_python(self, terms, due, covered, horizon):
+        """{(building, owner, currency): [due per month, covered per month, contract count per month]}"""
+        groups = {}
+        for i, key in enumerate(zip(terms['building'], terms['owner'], terms['currency'])):
+            group = groups.setdefault(key, [[0.0] * horizon, [0.0] * horizon, [0] * horizon])
+            for m in range(horizon):
+                if due[i][m]:
+                    group[0][m] += due[i][m]
+                    group[1][m] += covered[i][m]
+                    group[2][m] += 1
+        return groups
+
+    @api.model
+    def _aggregate_numpy(self, terms, due, covered, horizon):
+        keys = np.column_stack([terms['building'], terms['owner'], terms['currency']])
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        sum_due = np.zeros((len(unique_keys), horizon))
+        sum_covered = np.zeros((len(unique_keys), horizon))
+        counts = np.zeros((len(unique_keys), horizon), dtype=int)
+        np.add.at(sum_due, inverse, due)
+        np.add.at(sum_covered, inverse, covered)
+        np.add.at(counts, inverse, (due != 0).astype(int))
+        return {
+            tuple(int(k) for k in key): [sum_due[g].tolist(), sum_covered[g].tolist(), counts[g].tolist()]
+            for g, key in enumerate(unique_keys)
+        }
+
+    @api.model
+    def _compute_forecast_vals(self, company, today, horizon):
+        terms = self._load_contract_terms(company)
+        if not terms:
+            return []
+        first_idx = _month_index(today)
+        terms['period_dues'] = self._get_period_dues(terms, first_idx, horizon)
+        if np is not None:
+            due, covered = self._project_numpy(terms, first_idx, horizon)
+            groups = self._aggregate_numpy(terms, due, covered, horizon)
+        else:
+            due, covered = self._project_python(terms, first_idx, horizon)
+            groups = self._aggregate_python(terms, due, covered, horizon)
+
+        # one conversion factor per currency, from the cached rate table
+        Currency = self.env['res.currency']
+        company_currency = company.currency_id
+        factors = {
+            currency_id: Currency.browse(currency_id)._rent_convert(1.0, company_currency, company, today, round=False)
+            for currency_id in {key[2] for key in groups}
+        }
+        vals_list = []
+        for (building_id, owner_id, currency_id), (sum_due, sum_covered, counts) in groups.items():
+            factor = factors[currency_id]
+            for m in range(horizon):
+                if not sum_due[m]:
+                    continue
+                vals_list.append({
+                    'company_id': company.id,
+                    'forecast_date': today,
+                    'horizon': horizon,
+                    'month': _month_start(first_idx + m),
+                    'building_id': building_id,
+                    'owner_id': owner_id or False,
+                    'currency_id': currency_id,
+                    'amount_due': sum_due[m],
+                    'amount_covered': sum_covered[m],
+                    'amount_expected': sum_due[m] - sum_covered[m],
+                    'amount_due_company': company_currency.round(sum_due[m] * factor),
+                    'amount_expected_company': company_currency.round((sum_due[m] - sum_covered[m]) * factor),
+                    'contract_count': counts[m],
+                })
+        return vals_list
+
+    # ------------------------------------------------------------------ access
+    @api.model
+    def action_open_forecast(self, force=False):
+        lines = self._ensure_forecast(self.env.company, force=force)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Rent Forecast'),
+            'res_model': self._name,
+            'view_mode': 'pivot,graph,list',
+            'domain': [('id', 'in', lines.ids)],
+            'context': {'search_default_group_building': 1},
+        }
+
+    @api.model
+    def _get_forecast_data(self, company, months=None):
+        """Plain-data forecast (used by the JSON endpoint)."""
+        lines = self._ensure_forecast(company, months)
+        return [{
+            'month': fields.Date.to_string(line.month),
+            'building_id': line.building_id.id,
+            'building': line.building_id.display_name,
+            'owner_id': line.owner_id.id,
+            'owner': line.owner_id.display_name,
+            'currency': line.currency_id.name,
+            'amount_due': line.amount_due,
+            'amount_covered': line.amount_covered,
+            'amount_expected': line.amount_expected,
+            'amount_expected_company': line.amount_expected_company,
+            'contract_count': line.contract_count,
+        } for line in lines]
@@ -1,197 +1,454 @@
-# -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
-from datetime import timedelta, date as pydate
-from dateutil.relativedelta import relativedelta
-from odoo import api, fields, models, _
-from odoo.exceptions import UserError, ValidationError
-
-class RentPrepayment(models.Model):
-    _name = 'rent.prepayment'
-    _description = "Rent Prepayment / دفعة مقدّمة"
-    _order = 'date desc, id desc'
-
-    contract_id = fields.Many2one('rent.contract', required=True, ondelete='cascade')
-    date = fields.Date(default=fields.Date.context_today, required=True)
-    months = fields.Integer(string="Months Covered", default=1)
-    amount = fields.Monetary(string="Amount", required=True)
-    currency_id = fields.Many2one(
-        'res.currency', required=True,
-        default=lambda self: self.env.company.currency_id.id
-    )
-    description = fields.Char(string="Description", default="Advance payment")
-    move_id = fields.Many2one('account.move', string="Prepayment Invoice")
-    amount_consumed = fields.Monetary(string="Consumed", compute='_compute_consumed', store=True)
-    balance = fields.Monetary(string="Remaining", compute='_compute_consumed', store=True)
-
-    @api.constrains('amount', 'months')
-    def _check_positive(self):
-        for rec in self:
-            if rec.amount <= 0 or rec.months <= 0:
-                raise ValidationError(_("Amount and Months must be positive."))
-
-    @api.depends('amount', 'contract_id.prepayment_consumption_ids.prepayment_id', 'contract_id.prepayment_consumption_ids.amount')
-    def _compute_consumed(self):
-        for rec in self:
-            consumed = sum(rec.contract_id.prepayment_consumption_ids.filtered(lambda c: c.prepayment_id == rec).mapped('amount'))
-            rec.amount_consumed = consumed
-            rec.balance = rec.amount - consumed
-
-
-class RentPrepaymentConsumption(models.Model):
-    _name = 'rent.prepayment.consumption'
-    _description = "Prepayment Consumption Link"
-
-    contract_id = fields.Many2one('rent.contract', required=True, ondelete='cascade')
-    invoice_id = fields.Many2one('account.move', required=True)
-    prepayment_id = fields.Many2one('rent.prepayment', required=True)
-    amount = fields.Monetary(required=True)
-    currency_id = fields.Many2one(related='prepayment_id.currency_id', store=True)
-
-
-class RentContract(models.Model):
-    _inherit = 'rent.contract'
-
-    prepayment_ids = fields.One2many('rent.prepayment', 'contract_id', string="Advance Payments")
-    prepayment_consumption_ids = fields.One2many('rent.prepayment.consumption', 'contract_id', string="Advance Consumptions")
-
-    def _get_prepayment_balance(self):
-        self.ensure_one()
-        total = sum(self.prepayment_ids.mapped('amount'))
-        consumed = sum(self.prepayment_ids.mapped('amount_consumed'))
-        return total - consumed
-
-    def _apply_prepayment_to_invoice(self, invoice):
-        """Reduce invoice with available prepayment. Adds a negative line and records a consumption link."""
-        self.ensure_one()
-        if invoice.move_type != 'out_invoice':
-            return
-
-        balance = self._get_prepayment_balance()
-        if balance <= 0:
-            return
-
-        # Amount to cover (tax excluded or included? We use untaxed for simplicity; adjust if needed)
-        to_cover = min(balance, abs(invoice.amount_total))
-        if not to_cover:
-            return
-
-        product = self.env.ref('product.product_product_consumable', raise_if_not_found=False)
-        invoice.write({
-            'invoice_line_ids': [(0, 0, {
-                'name': _('Advance Payment Consumption / استهلاك دفعة مقدّمة'),
-                'quantity': 1.0,
-                'price_unit': -to_cover,  
-                'product_id': product.id if product else False,
-                'tax_ids': False,         
-            })]
-        })
-
-        if hasattr(invoice, '_onchange_invoice_line_ids'):
-            invoice._onchange_invoice_line_ids()
-
-        # Record consumption split across prepayments (FIFO)
-        remaining = to_cover
-        for prepay in self.prepayment_ids.sorted('date'):
-            if remaining <= 0:
-                break
-            avail = prepay.balance
-            if avail <= 0:
-                continue
-            consume_now = min(avail, remaining)
-            self.env['rent.prepayment.consumption'].create({
-                'contract_id': self.id,
-                'invoice_id': invoice.id,
-                'prepayment_id': prepay.id,
-                'amount': consume_now,
-            })
-            remaining -= consume_now
-
-        # done
-        return True
-
-    def _month_bounds(self, day):
-        """Return (first_day, last_day) for the month of 'day' (python date)."""
-        first = day.replace(day=1)
-        last = (first + relativedelta(months=1)) - timedelta(days=1)
-        return first, last
-
-    def _find_month_invoice(self, on_date):
-        """Find the draft/posted invoice of this contract for the month of on_date."""
-        self.ensure_one()
-        first, last = self._month_bounds(on_date)
-        return self.env['account.move'].search([
-            ('move_type', '=', 'out_invoice'),
-            ('partner_id', '=', self.partner_id.id),
-            ('x_building_id', '=', self.building_id.id),
-            ('x_unit_id', '=', self.unit_id.id),
-            ('invoice_date', '>=', first),
-            ('invoice_date', '<=', last),
-        ], order='id desc', limit=1)
-
-    def _ensure_month_invoice(self, on_date):
-        """Return a draft invoice for the period; create one if missing (with your tags & owner)."""
-        self.ensure_one()
-        inv = self._find_month_invoice(on_date)
-        if inv and inv.state == 'draft':
-            return inv
-        if inv and inv.state == 'posted':
-            # already billed this month → nothing to create
-            return inv
-
-        # create a new draft using your existing builder but with invoice_date = on_date
-        vals = self._prepare_invoice_vals()
-        vals['invoice_date'] = on_date
-        return self.env['account.move'].create(vals)
-    
-
-    @api.model
-    def cron_consume_prepayments_daily(self):
-        """Daily: for contracts due today, create/find the month invoice and consume prepayment."""
-        today = fields.Date.context_today(self)
-        domain = [
-            ('state', '=', 'active'),
-            '|', ('start_date', '=', False), ('start_date', '<=', today),
-            '|', ('end_date',   '=', False), ('end_date',   '>=', today),
-            ('rent_due_day', '=', today.day),
-            '|', ('last_due_activity_date', '=', False), ('last_due_activity_date', '<', today),
-        ]
-        contracts = self.search(domain)
-        if not contracts:
-            return
-
-        todo_type = self.env.ref('mail.mail_activity_data_todo')
-        for c in contracts:
-            inv = c._ensure_month_invoice(today)
-
-            # avoid double-consuming if this cron runs again
-            already_consumed = bool(self.env['rent.prepayment.consumption'].search_count([('invoice_id', '=', inv.id)]))
-            if inv.state == 'draft' and not already_consumed:
-                # apply prepayment (adds negative line + FIFO links)
-                c._apply_prepayment_to_invoice(inv)
-
-                # recompute totals if onchange hook exists (you’re on 18; safe fallback)
-                if hasattr(inv, '_onchange_invoice_line_ids'):
-                    inv._onchange_invoice_line_ids()
-
-                # post if fully covered → becomes paid at 0 total
-                if inv.amount_total == 0 and hasattr(inv, 'action_post'):
-                    inv.action_post()
-
-            # stamp the date so we don’t create duplicate reminders today
-            c.last_due_activity_date = today
-
-            # if there’s uncovered remainder, create a reminder to collect it
-            monthly_due = c.amount if c.recurrence == 'month' else (c.amount / 12.0)
-            prepay_bal = c._get_prepayment_balance() if hasattr(c, '_get_prepayment_balance') else 0.0
-
-            # Consider remainder after consumption (if draft, use its current total; if posted, use residual)
-            remainder = inv.amount_residual if inv.state == 'posted' else inv.amount_total
-            if remainder and remainder > 0:
-                c.activity_schedule(
-                    activity_type_id=todo_type.id,
-                    date_deadline=today,
-                    user_id=c.responsible_id.id or self.env.user.id,
-                    summary=_('Collect Rent (Uncovered Amount)'),
-                    note=_('Remaining amount for %s: %.2f') % (c.name, remainder),
-                )
\ No newline at end of file
+# -*- coding: utf-8 -*-
+import time
+from collections import defaultdict
+
+import psycopg2
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from datetime import timedelta, date as pydate
+from dateutil.relativedelta import relativedelta
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL, split_every
+
+
+class RentPrepaymentBalanceMixin(models.AbstractModel):
+    """Keeps rent.contract.prepayment_balance up to date with per-contract deltas
+    instead of re-summing all advances/consumptions of the contract."""
+    _name = 'rent.prepayment.balance.mixin'
+    _description = "Rent Prepayment Balance Maintenance"
+
+    # +1 for advances (increase the balance), -1 for consumptions
+    _balance_sign = 1
+    # fields whose change moves the balance
+    _balance_fields = ('amount', 'contract_id')
+
+    def _get_contract_amount(self):
+        """Amount of the record in the currency of its contract."""
+        self.ensure_one()
+        return self.amount
+
+    def _get_balance_deltas(self, sign=1):
+        deltas = defaultdict(float)
+        for rec in self:
+            deltas[rec.contract_id.id] += sign * self._balance_sign * rec._get_contract_amount()
+        return deltas
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['rent.contract']._add_to_prepayment_balance(records._get_balance_deltas())
+        return records
+
+    def write(self, vals):
+        if not set(self._balance_fields) & set(vals):
+            return super().write(vals)
+        deltas = self._get_balance_deltas(sign=-1)
+        res = super().write(vals)
+        for contract_id, delta in self._get_balance_deltas().items():
+            deltas[contract_id] += delta
+        self.env['rent.contract']._add_to_prepayment_balance(deltas)
+        return res
+
+    def unlink(self):
+        deltas = self._get_balance_deltas(sign=-1)
+        res = super().unlink()
+        self.env['rent.contract']._add_to_prepayment_balance(deltas)
+        return res
+
+
+class RentPrepayment(models.Model):
+    _name = 'rent.prepayment'
+    _inherit = ['rent.prepayment.balance.mixin']
+    _description = "Rent Prepayment / دفعة مقدّمة"
+    _order = 'date desc, id desc'
+    _balance_fields = ('amount', 'contract_id', 'currency_id', 'date')
+
+    contract_id = fields.Many2one('rent.contract', required=True, ondelete='cascade')
+    date = fields.Date(default=fields.Date.context_today, required=True)
+    months = fields.Integer(string="Months Covered", default=1)
+    amount = fields.Monetary(string="Amount", required=True)
+    currency_id = fields.Many2one(
+        'res.currency', required=True,
+        default=lambda self: self.env.company.currency_id.id
+    )
+    description = fields.Char(string="Description", default="Advance payment")
+    move_id = fields.Many2one('account.move', string="Prepayment Invoice")
+    consumption_ids = fields.One2many('rent.prepayment.consumption', 'prepayment_id', string="Consumptions")
+    amount_consumed = fields.Monetary(string="Consumed", compute='_compute_consumed', store=True)
+    balance = fields.Monetary(string="Remaining", compute='_compute_consumed', store=True)
+
+    @api.constrains('amount', 'months')
+    def _check_positive(self):
+        for rec in self:
+            if rec.amount <= 0 or rec.months <= 0:
+                raise ValidationError(_("Amount and Months must be positive."))
+
+    def _get_contract_amount(self):
+        """Advances may be paid in another currency than the contract's: converted at their date."""
+        self.ensure_one()
+        contract = self.contract_id
+        return self.currency_id._rent_convert(self.amount, contract.currency_id, contract.company_id, self.date)
+
+    @api.depends('amount', 'currency_id', 'date', 'contract_id.currency_id', 'consumption_ids.amount')
+    def _compute_consumed(self):
+        # one grouped SUM for the whole batch instead of filtering the contract's consumptions per prepayment
+        consumed_by_prepayment = {}
+        prepayment_ids = [id_ for id_ in self._origin.ids if id_]
+        if prepayment_ids:
+            consumed_by_prepayment = {
+                prepayment.id: amount
+                for prepayment, amount in self.env['rent.prepayment.consumption']._read_group(
+                    [('prepayment_id', 'in', prepayment_ids)], ['prepayment_id'], ['amount:sum'],
+                )
+            }
+        for rec in self:
+            # consumptions are in the contract currency
+            consumed = consumed_by_prepayment.get(rec._origin.id, 0.0)
+            contract = rec.contract_id
+            if consumed and contract.currency_id != rec.currency_id:
+                consumed = contract.currency_id._rent_convert(consumed, rec.currency_id, contract.company_id, rec.date)
+            rec.amount_consumed = consumed
+            rec.balance = rec.amount - consumed
+
+
+class RentPrepaymentConsumption(models.Model):
+    _name = 'rent.prepayment.consumption'
+    _inherit = ['rent.prepayment.balance.mixin']
+    _description = "Prepayment Consumption Link"
+
+    _balance_sign = -1
+
+    contract_id = fields.Many2one('rent.contract', required=True, ondelete='cascade')
+    invoice_id = fields.Many2one('account.move', required=True)
+    prepayment_id = fields.Many2one('rent.prepayment', required=True)
+    amount = fields.Monetary(required=True)
+    # consumptions cover invoices of the contract: they are in the contract currency
+    currency_id = fields.Many2one(related='contract_id.currency_id', store=True)
+
+
+class RentContract(models.Model):
+    _inherit = 'rent.contract'
+
+    prepayment_ids = fields.One2many('rent.prepayment', 'contract_id', string="Advance Payments")
+    prepayment_consumption_ids = fields.One2many('rent.prepayment.consumption', 'contract_id', string="Advance Consumptions")
+    prepayment_balance = fields.Monetary(
+        string="Advance Balance", currency_field='currency_id', readonly=True, copy=False, index=True,
+        help="Advances minus consumptions, updated incrementally whenever one of them changes.")
+
+    def _get_prepayment_balance(self):
+        """Available advances, in the contract currency."""
+        self.ensure_one()
+        return self.prepayment_balance
+
+    @api.model
+    def _add_to_prepayment_balance(self, deltas):
+        """Apply {contract_id: delta} to the stored prepayment_balance with a single UPDATE."""
+        deltas = {contract_id: delta for contract_id, delta in deltas.items() if contract_id and delta}
+        if not deltas:
+            return
+        self.env.cr.execute(SQL(
+            """
+            UPDATE rent_contract c
+               SET prepayment_balance = COALESCE(c.prepayment_balance, 0) + d.delta
+              FROM (VALUES %s) AS d(id, delta)
+             WHERE c.id = d.id
+            """,
+            SQL(", ").join(SQL("(%s, %s::numeric)", contract_id, delta) for contract_id, delta in deltas.items()),
+        ))
+        self.browse(list(deltas)).invalidate_recordset(['prepayment_balance'])
+
+    def _recompute_prepayment_balance(self):
+        """Rebuild prepayment_balance from scratch (all contracts when self is empty), e.g. after a migration.
+
+        Advances are summed per (contract, currency, date) and converted to the contract currency
+        through the cached rate table; consumptions are already in the contract currency."""
+        domain = [('contract_id', 'in', self.ids)] if self else []
+        balances = defaultdict(float)
+        for contract, currency, day, amount in self.env['rent.prepayment']._read_group(
+            domain, ['contract_id', 'currency_id', 'date:day'], ['amount:sum'],
+        ):
+            balances[contract.id] += currency._rent_convert(amount, contract.currency_id, contract.company_id, day)
+        for contract, amount in self.env['rent.prepayment.consumption']._read_group(
+            domain, ['contract_id'], ['amount:sum'],
+        ):
+            balances[contract.id] -= amount
+        where = SQL("WHERE id IN %s", tuple(self.ids)) if self else SQL()
+        self.env.cr.execute(SQL("UPDATE rent_contract SET prepayment_balance = 0 %s", where))
+        self.env['rent.contract'].invalidate_model(['prepayment_balance'])
+        for contract_ids in split_every(self._get_cron_batch_size(), list(balances)):
+            self._add_to_prepayment_balance({contract_id: balances[contract_id] for contract_id in contract_ids})
+
+    def _apply_prepayment_to_invoice(self, invoice):
+        """Reduce invoice with available prepayment. Adds a negative line and records a consumption link."""
+        self.ensure_one()
+        if invoice.move_type != 'out_invoice':
+            return
+        return bool(self._allocate_prepayments([(self, invoice, None)])) or None
+
+    @api.model
+    def _allocate_prepayments(self, requests):
+        """Batch FIFO allocation of prepayments over many invoices.
+
+        :param requests: iterable of ``(contract, invoice, amount)``; ``amount=None`` covers the invoice total.
+            Requests are served in the given order, each one limited by what is left of its contract's balance.
+        :return: the created ``rent.prepayment.consumption`` records
+
+        Open prepayment balances are prefetched with one query and split in memory, oldest first (same
+        slices as the per-invoice loop this replaces); the negative invoice lines and the consumption links
+        of the whole batch are then written with one create() each.
+        """
+        Consumption = self.env['rent.prepayment.consumption']
+        requests = [(c, inv, amount) for c, inv, amount in requests if inv.move_type == 'out_invoice']
+        if not requests:
+            return Consumption
+
+        contract_ids = list({c.id for c, _inv, _amount in requests})
+        balances = {c.id: c._get_prepayment_balance() for c, _inv, _amount in requests}
+        # FIFO queues of [prepayment_id, available]. 'date asc, id desc' reproduces the former
+        # prepayment_ids.sorted('date'), a stable sort over the default 'date desc, id desc' order.
+        queues = defaultdict(list)
+        for prepay in self.env['rent.prepayment'].search(
+            [('contract_id', 'in', contract_ids), ('balance', '>', 0)], order='date asc, id desc',
+        ):
+            contract = prepay.contract_id
+            available = prepay.currency_id._rent_convert(prepay.balance, contract.currency_id, contract.company_id, prepay.date)
+            queues[contract.id].append([prepay.id, available])
+
+        product = self.env.ref('product.product_product_consumable', raise_if_not_found=False)
+        line_vals_list = []
+        consumption_vals_list = []
+        for contract, invoice, amount in requests:
+            balance = balances[contract.id]
+            if balance <= 0:
+                continue
+
+            # Amount to cover (tax excluded or included? We use untaxed for simplicity; adjust if needed)
+            to_cover = min(balance, abs(invoice.amount_total) if amount is None else amount)
+            if not to_cover:
+                continue
+            balances[contract.id] -= to_cover
+
+            line_vals_list.append({
+                'move_id': invoice.id,
+                'name': _('Advance Payment Consumption / استهلاك دفعة مقدّمة'),
+                'quantity': 1.0,
+                'price_unit': -to_cover,
+                'product_id': product.id if product else False,
+                'tax_ids': False,
+            })
+
+            # Record consumption split across prepayments (FIFO)
+            remaining = to_cover
+            for slot in queues[contract.id]:
+                if remaining <= 0:
+                    break
+                if slot[1] <= 0:
+                    continue
+                consume_now = min(slot[1], remaining)
+                consumption_vals_list.append({
+                    'contract_id': contract.id,
+                    'invoice_id': invoice.id,
+                    'prepayment_id': slot[0],
+                    'amount': consume_now,
+                })
+                slot[1] -= consume_now
+                remaining -= consume_now
+
+        if not line_vals_list:
+            return Consumption
+        lines = self.env['account.move.line'].with_context(check_move_validity=False).create(line_vals_list)
+        for invoice in lines.move_id:
+            if hasattr(invoice, '_onchange_invoice_line_ids'):
+                invoice._onchange_invoice_line_ids()
+        return Consumption.create(consumption_vals_list)
+
+    def _month_bounds(self, day):
+        """Return (first_day, last_day) for the month of 'day' (python date)."""
+        first = day.replace(day=1)
+        last = (first + relativedelta(months=1)) - timedelta(days=1)
+        return first, last
+
+    def _get_billing_period(self, day):
+        """Billing period key of 'day': the first day of its month."""
+        return day.replace(day=1)
+
+    def _find_month_invoice(self, on_date):
+        """Find the draft/posted invoice of this contract for the month of on_date."""
+        self.ensure_one()
+        return self._find_month_invoices(on_date)[self.id]
+
+    def _ensure_month_invoice(self, on_date):
+        """Return a draft invoice for the period; create one if missing (with your tags & owner)."""
+        self.ensure_one()
+        return self._ensure_month_invoices(on_date)[self.id]
+
+    def _find_month_invoices(self, on_date):
+        """Batch version of _find_month_invoice: {contract.id: invoice} for the month of on_date.
+
+        Rent invoices are stamped with (contract_id, billing_period, rent_kind), unique while not
+        cancelled, so this is one indexed equality lookup for the whole recordset.
+        Contracts without invoice map to an empty recordset."""
+        Move = self.env['account.move']
+        moves = Move.search([
+            ('contract_id', 'in', self.ids),
+            ('billing_period', '=', self._get_billing_period(on_date)),
+            ('rent_kind', '=', 'rent'),
+            ('state', '!=', 'cancel'),
+        ])
+        by_contract = {mv.contract_id.id: mv for mv in moves}
+        return {c.id: by_contract.get(c.id, Move) for c in self}
+
+    def _create_month_invoices(self, on_date):
+        """Create the period invoice of every contract in self; {contract.id: invoice}.
+
+        The whole set is created with a single create() under a savepoint. When one of the periods
+        was billed meanwhile (cron retry, concurrent worker), the account_move_rent_billing_period_uniq
+        index rejects it: the invoices are then created one by one, each in its own savepoint, and
+        a rejected one is replaced by the existing invoice."""
+        Move = self.env['account.move']
+        vals_by_contract = {}
+        for c in self:
+            vals = c._prepare_invoice_vals(on_date)
+            vals_by_contract[c] = vals
+        try:
+            with self.env.cr.savepoint():
+                new_moves = Move.create(list(vals_by_contract.values()))
+            return dict(zip(self.ids, new_moves))
+        except psycopg2.errors.UniqueViolation:
+            self.env.transaction.clear()
+
+        invoices = {}
+        for c, vals in vals_by_contract.items():
+            try:
+                with self.env.cr.savepoint():
+                    invoices[c.id] = Move.create(vals)
+            except psycopg2.errors.UniqueViolation:
+                self.env.transaction.clear()
+                invoices[c.id] = c._find_month_invoice(on_date)
+        return invoices
+
+    def _ensure_month_invoices(self, on_date):
+        """Batch version of _ensure_month_invoice: missing invoices are created with a single create().
+
+        Safe across cron retries and concurrent workers: a second invoice for the same (contract,
+        period) is rejected by the account_move_rent_billing_period_uniq index and the existing one
+        is returned instead (see _create_month_invoices)."""
+        invoices = self._find_month_invoices(on_date)
+        missing = self.filtered(lambda c: not invoices[c.id])
+        if missing:
+            invoices.update(missing._create_month_invoices(on_date))
+        return invoices
+
+    def _apply_prepayment_to_invoices(self, invoices):
+        """Apply the prepayments of every contract in self to invoices[contract.id]."""
+        return self._allocate_prepayments([(c, invoices[c.id], None) for c in self])
+
+    def _consume_prepayments_batch(self, today, run=None):
+        """Set-based billing of one chunk of due contracts, for the period of their next_due_date."""
+        run = run or self.env['rent.cron.run']
+        Move = self.env['account.move']
+        with run._phase('invoice'):
+            invoices = {}
+            contracts_by_date = defaultdict(lambda: self.browse())
+            for c in self:
+                contracts_by_date[c.next_due_date] |= c
+            for due_date, contracts in contracts_by_date.items():
+                # same as _ensure_month_invoices, counting the created invoices
+                found = contracts._find_month_invoices(due_date)
+                missing = contracts.filtered(lambda c: not found[c.id])
+                if missing:
+                    found.update(missing._create_month_invoices(due_date))
+                    run._add(invoices_created=len(missing))
+                invoices.update(found)
+            all_moves = Move.union(*invoices.values())
+
+        with run._phase('allocate'):
+            # avoid double-consuming if this cron runs again
+            consumed_ids = set(self.env['rent.prepayment.consumption'].search([
+                ('invoice_id', 'in', all_moves.ids),
+            ]).invoice_id.ids)
+            to_apply = self.filtered(
+                lambda c: invoices[c.id].state == 'draft' and invoices[c.id].id not in consumed_ids
+            )
+            if to_apply:
+                # apply prepayment (adds negative line + FIFO links)
+                consumptions = to_apply._apply_prepayment_to_invoices(invoices)
+                run._add(consumptions_written=len(consumptions))
+
+                # post if fully covered → becomes paid at 0 total
+                to_post = Move.union(*(invoices[c.id] for c in to_apply)).filtered(lambda m: m.amount_total == 0)
+                if to_post:
+                    to_post.action_post()
+
+        with run._phase('notify'):
+            # if there’s uncovered remainder, create a reminder to collect it (one bulk insert)
+            todo_type = self.env.ref('mail.mail_activity_data_todo')
+            # the reminder cron may already have opened an activity for this due date: reuse it
+            open_activities = self._get_open_due_activities(todo_type)
+            activity_vals_list = []
+            for c in self:
+                inv = invoices[c.id]
+                # Consider remainder after consumption (if draft, use its current total; if posted, use residual)
+                remainder = inv.amount_residual if inv.state == 'posted' else inv.amount_total
+                if remainder and remainder > 0:
+                    vals = c._prepare_due_activity_vals(
+                        todo_type, c.next_due_date,
+                        _('Collect Rent (Uncovered Amount)'),
+                        _('Remaining amount for %s: %.2f') % (c.name, remainder),
+                    )
+                    if c.id in open_activities:
+                        open_activities[c.id].write({key: vals[key] for key in ('summary', 'note', 'date_deadline')})
+                    else:
+                        activity_vals_list.append(vals)
+            if activity_vals_list:
+                self.env['mail.activity'].create(activity_vals_list)
+            run._add(activities_scheduled=len(activity_vals_list))
+
+            # the period is processed: stamp the run and move to the next due date
+            self.with_context(tracking_disable=True)._advance_next_due_date({'last_due_activity_date': today})
+
+    @api.model
+    def cron_consume_prepayments_daily(self):
+        """Daily: for contracts due (next_due_date <= today), create/find the period invoice and consume prepayment."""
+        self._run_cron_job('billing', self._consume_prepayments_due)
+
+    @api.model
+    def cron_consume_prepayments_worker(self):
+        """Extra worker: only joins sharded runs, the main cron handles unsharded ones alone."""
+        if self._get_cron_shard_count() > 1:
+            self.cron_consume_prepayments_daily()
+
+    @api.model
+    def _consume_prepayments_due(self, today, extra_domain=(), shard=None, run=None):
+        """Bill every due contract matching extra_domain (the whole portfolio, or one shard).
+
+        Due contracts are billed set-wise in chunks of ``estate_rent_mgmt.cron_batch_size``
+        with one commit per chunk, so the run grows with the number of batches, not contracts.
+        Each chunk advances next_due_date, so missed periods are caught up on the following rounds.
+        Contracts that fail are logged on the run and left for the next day."""
+        run = run or self.env['rent.cron.run']
+        domain = self._get_due_contracts_domain(today) + list(extra_domain)
+        batch_size = self._get_cron_batch_size()
+
+        auto_commit = self._cron_auto_commit()
+        failed_ids = []
+        while True:
+            with run._phase('select'):
+                batch = self.search(domain + [('id', 'not in', failed_ids)], order='next_due_date, id', limit=batch_size)
+            if not batch:
+                break
+            if shard:
+                # renew the lease before the batch runs, so a slow batch is not re-claimed meanwhile
+                shard._heartbeat()
+                if auto_commit:
+                    self.env.cr.commit()
+            started = time.perf_counter()
+            run._add(contracts_selected=len(batch))
+            failed_ids += batch._run_batch('_consume_prepayments_batch', today, run).ids
+            run._batch_done(time.perf_counter() - started)
+            if auto_commit:
+                self.env.cr.commit()
+            # keep memory bounded on large portfolios
+            self.env.invalidate_all()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models
+from odoo.tools import drop_view_if_exists
+
+
+class RentRollReport(models.Model):
+    """Rent roll: one row per unit with its active contract, paid-through date and aged arrears.
+
+    Arrears are the open customer invoices/refunds tagged with the unit (``x_unit_id``), aged in
+    SQL from their due date; the paid-through date comes from the ``billing_period`` of the
+    active contract's rent invoices and the period end of their schedule lines. The whole portfolio is therefore one query."""
+    _name = 'rent.roll.report'
+    _description = 'Rent Roll & Aged Arrears'
+    _auto = False
+    _order = 'building_id, unit_id'
+
+    unit_id = fields.Many2one('estate.building.unit', string='الوحدة/الشقة', readonly=True)
+    building_id = fields.Many2one('estate.building', string='البناية', readonly=True)
+    owner_id = fields.Many2one('res.partner', string='Owner / المالك', readonly=True)
+    company_id = fields.Many2one('res.company', string='الشركة', readonly=True)
+    occupied = fields.Boolean(string='مشغولة؟', readonly=True)
+    contract_id = fields.Many2one('rent.contract', string='العقد', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='المستأجر', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+    rent_amount = fields.Monetary(string='مبلغ الإيجار', currency_field='currency_id', readonly=True)
+    recurrence = fields.Selection([('month', 'شهري'), ('year', 'سنوي')], string='دورية الدفع', readonly=True)
+    start_date = fields.Date(string='تاريخ البداية', readonly=True)
+    end_date = fields.Date(string='تاريخ النهاية', readonly=True)
+    next_due_date = fields.Date(string='Next Due Date', readonly=True)
+    paid_through = fields.Date(string='Paid Through', readonly=True)
+
+    # arrears, in company currency
+    company_currency_id = fields.Many2one('res.currency', string='Company Currency', readonly=True)
+    not_due = fields.Monetary(string='Not Due', currency_field='company_currency_id', readonly=True)
+    due_0_30 = fields.Monetary(string='0-30', currency_field='company_currency_id', readonly=True)
+    due_31_60 = fields.Monetary(string='31-60', currency_field='company_currency_id', readonly=True)
+    due_61_90 = fields.Monetary(string='61-90', currency_field='company_currency_id', readonly=True)
+    due_90_plus = fields.Monetary(string='90+', currency_field='company_currency_id', readonly=True)
+    arrears_total = fields.Monetary(string='Total Open', currency_field='company_currency_id', readonly=True)
+    oldest_due_date = fields.Date(string='Oldest Due Date', readonly=True)
+
+    def _query(self):
+        return """
+            WITH open_moves AS (
+                SELECT m.x_unit_id AS unit_id,
+                       SUM(m.amount_residual_signed) FILTER (WHERE m.age < 0) AS not_due,
+                       SUM(m.amount_residual_signed) FILTER (WHERE m.age BETWEEN 0 AND 30) AS due_0_30,
+                       SUM(m.amount_residual_signed) FILTER (WHERE m.age BETWEEN 31 AND 60) AS due_31_60,
+                       SUM(m.amount_residual_signed) FILTER (WHERE m.age BETWEEN 61 AND 90) AS due_61_90,
+                       SUM(m.amount_residual_signed) FILTER (WHERE m.age > 90) AS due_90_plus,
+                       SUM(m.amount_residual_signed) AS total,
+                       MIN(m.due_date) AS oldest_due_date
+                  FROM (
+                        SELECT x_unit_id, amount_residual_signed,
+                               COALESCE(invoice_date_due, invoice_date, date) AS due_date,
+                               CURRENT_DATE - COALESCE(invoice_date_due, invoice_date, date) AS age
+                          FROM account_move
+                         WHERE x_unit_id IS NOT NULL
+                           AND state = 'posted'
+                           AND move_type IN ('out_invoice', 'out_refund')
+                           AND payment_state IN ('not_paid', 'partial')
+                       ) m
+              GROUP BY m.x_unit_id
+            ), periods AS (
+                -- a paid period ends where its schedule line ends (yearly and stub periods);
+                -- invoices without schedule line are monthly periods
+                SELECT m.contract_id,
+                       MIN(m.billing_period) FILTER (WHERE m.payment_state NOT IN ('paid', 'in_payment', 'reversed'))
+                           AS first_open_period,
+                       MAX(COALESCE(s.period_end, (m.billing_period + interval '1 month' - interval '1 day')::date))
+                           FILTER (WHERE m.payment_state IN ('paid', 'in_payment', 'reversed'))
+                           AS last_paid_end
+                  FROM account_move m
+             LEFT JOIN rent_contract_schedule s ON s.invoice_id = m.id
+                 WHERE m.billing_period IS NOT NULL
+                   AND m.rent_kind = 'rent'
+                   AND m.state = 'posted'
+                   AND m.contract_id IN (SELECT active_contract_id FROM estate_building_unit
+                                          WHERE active_contract_id IS NOT NULL)
+              GROUP BY m.contract_id
+            )
+            SELECT u.id AS id,
+                   u.id AS unit_id,
+                   u.building_id,
+                   u.effective_owner_id AS owner_id,
+                   b.company_id,
+                   u.occupied,
+                   c.id AS contract_id,
+                   c.partner_id,
+                   c.currency_id,
+                   c.amount AS rent_amount,
+                   c.recurrence,
+                   c.start_date,
+                   c.end_date,
+                   c.next_due_date,
+                   CASE
+                       WHEN p.first_open_period IS NOT NULL THEN p.first_open_period - 1
+                       ELSE p.last_paid_end
+                   END AS paid_through,
+                   rc.currency_id AS company_currency_id,
+                   COALESCE(o.not_due, 0) AS not_due,
+                   COALESCE(o.due_0_30, 0) AS due_0_30,
+                   COALESCE(o.due_31_60, 0) AS due_31_60,
+                   COALESCE(o.due_61_90, 0) AS due_61_90,
+                   COALESCE(o.due_90_plus, 0) AS due_90_plus,
+                   COALESCE(o.total, 0) AS arrears_total,
+                   o.oldest_due_date
+              FROM estate_building_unit u
+              JOIN estate_building b ON b.id = u.building_id
+              JOIN res_company rc ON rc.id = b.company_id
+         LEFT JOIN rent_contract c ON c.id = u.active_contract_id
+         LEFT JOIN periods p ON p.contract_id = c.id
+         LEFT JOIN open_moves o ON o.unit_id = u.id
+        """
+
+    def init(self):
+        drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f'CREATE OR REPLACE VIEW "{self._table}" AS ({self._query()})')
@@ -1,94 +1,190 @@
-# -*- coding: utf-8 -*-
-from odoo import api, fields, models, _
-from odoo.exceptions import UserError
-
-class RentUtilityType(models.Model):
-    _name = 'rent.utility.type'
-    _description = 'Rent Utility Type'
-    _order = 'name'
-
-    name = fields.Char(required=True)
-    product_id = fields.Many2one(
-        'product.product', string='Service Product', required=True,
-        domain=[('type', '=', 'service')]
-    )
-    pricing = fields.Selection(
-        [('fixed', 'Fixed per Period'),
-         ('meter', 'Per Unit (Meter Reading)')],
-        default='meter', required=True
-    )
-    unit_rate = fields.Float(
-        string='Default Unit Rate',
-        help="For meter pricing: price per unit (e.g., per kWh / per m³).\n"
-             "For fixed pricing: default amount per period."
-    )
-    uom_id = fields.Many2one('uom.uom', string='Unit of Measure')
-
-class RentUtilityExpense(models.Model):
-    _name = 'rent.utility.expense'
-    _description = 'Rent Utility Expense'
-    _order = 'period_start desc, id desc'
-
-    name = fields.Char(default=lambda s: _('Utility'), required=True)
-    contract_id = fields.Many2one('rent.contract', required=True, ondelete='cascade')
-    type_id = fields.Many2one('rent.utility.type', required=True)
-    period_start = fields.Date(required=True)
-    period_end = fields.Date(required=True)
-
-    type_pricing = fields.Selection(related='type_id.pricing', store=False, readonly=True)
-    
-    # Metering
-    reading_start = fields.Float()
-    reading_end = fields.Float()
-    units = fields.Float(compute='_compute_units', store=True)
-    unit_rate = fields.Float(help="Override the default rate if needed.")
-    amount = fields.Monetary(currency_field='currency_id', required=True)
-    currency_id = fields.Many2one(
-        'res.currency', default=lambda s: s.env.company.currency_id.id, required=True
-    )
-
-    invoice_id = fields.Many2one('account.move', domain=[('move_type', '=', 'out_invoice')])
-    move_line_id = fields.Many2one('account.move.line')  # optional bookmark for the exact line
-    state = fields.Selection(
-        [('draft', 'Draft'), ('billed', 'Billed'), ('paid', 'Paid')],
-        compute='_compute_state', store=True, default='draft'
-    )
-    notes = fields.Char()
-
-    @api.depends('reading_start', 'reading_end', 'type_id.pricing')
-    def _compute_units(self):
-        for rec in self:
-            if rec.type_id and rec.type_id.pricing == 'meter':
-                rec.units = max((rec.reading_end or 0.0) - (rec.reading_start or 0.0), 0.0)
-            else:
-                rec.units = 1.0
-
-    @api.onchange('type_id')
-    def _onchange_type(self):
-        for rec in self:
-            if rec.type_id:
-                rec.unit_rate = rec.type_id.unit_rate
-                # default amount guess
-                if rec.type_id.pricing == 'fixed':
-                    rec.amount = rec.type_id.unit_rate
-                elif rec.type_id.pricing == 'meter':
-                    rec.amount = rec.units * (rec.unit_rate or 0.0)
-
-    @api.onchange('units', 'unit_rate', 'type_id')
-    def _onchange_amount_from_units(self):
-        for rec in self:
-            if rec.type_id and rec.type_id.pricing == 'meter':
-                rec.amount = (rec.units or 0.0) * (rec.unit_rate or 0.0)
-
-    @api.depends('invoice_id.payment_state')
-    def _compute_state(self):
-        for rec in self:
-            if not rec.invoice_id:
-                rec.state = 'draft'
-            else:
-                if rec.invoice_id.payment_state == 'paid':
-                    rec.state = 'paid'
-                else:
-                    rec.state = 'billed'
-
-
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools.sql import create_index
+
+class RentUtilityType(models.Model):
+    _name = 'rent.utility.type'
+    _description = 'Rent Utility Type'
+    _order = 'name'
+
+    name = fields.Char(required=True)
+    product_id = fields.Many2one(
+        'product.product', string='Service Product', required=True,
+        domain=[('type', '=', 'service')]
+    )
+    pricing = fields.Selection(
+        [('fixed', 'Fixed per Period'),
+         ('meter', 'Per Unit (Meter Reading)')],
+        default='meter', required=True
+    )
+    unit_rate = fields.Float(
+        string='Default Unit Rate',
+        help="For meter pricing: price per unit (e.g., per kWh / per m³).\n"
+             "For fixed pricing: default amount per period."
+    )
+    uom_id = fields.Many2one('uom.uom', string='Unit of Measure')
+    max_units_per_period = fields.Float(
+        string='Max Units per Period',
+        help="Meter imports reject readings whose consumption exceeds this value (0 = no limit).")
+
+class RentUtilityExpense(models.Model):
+    _name = 'rent.utility.expense'
+    _description = 'Rent Utility Expense'
+    _order = 'period_start desc, id desc'
+
+    name = fields.Char(default=lambda s: _('Utility'), required=True)
+    contract_id = fields.Many2one('rent.contract', required=True, ondelete='cascade')
+    type_id = fields.Many2one('rent.utility.type', required=True)
+    period_start = fields.Date(required=True)
+    period_end = fields.Date(required=True)
+
+    type_pricing = fields.Selection(related='type_id.pricing', store=False, readonly=True)
+    
+    # Metering
+    reading_start = fields.Float()
+    reading_end = fields.Float()
+    units = fields.Float(compute='_compute_units', store=True)
+    unit_rate = fields.Float(help="Override the default rate if needed.")
+    amount = fields.Monetary(currency_field='currency_id', required=True)
+    currency_id = fields.Many2one(
+        'res.currency', default=lambda s: s.env.company.currency_id.id, required=True
+    )
+
+    invoice_id = fields.Many2one('account.move', domain=[('move_type', '=', 'out_invoice')])
+    move_line_id = fields.Many2one('account.move.line')  # optional bookmark for the exact line
+    state = fields.Selection(
+        [('draft', 'Draft'), ('billed', 'Billed'), ('paid', 'Paid')],
+        compute='_compute_state', store=True, default='draft'
+    )
+    notes = fields.Char()
+
+    def init(self):
+        super().init()
+        # previous reading lookup of the meter import (DISTINCT ON contract, type)
+        create_index(self.env.cr, 'rent_utility_expense_last_reading_idx', self._table,
+                     ['contract_id', 'type_id', 'period_end DESC', 'id DESC'])
+
+    @api.depends('reading_start', 'reading_end', 'type_id.pricing')
+    def _compute_units(self):
+        for rec in self:
+            if rec.type_id and rec.type_id.pricing == 'meter':
+                rec.units = max((rec.reading_end or 0.0) - (rec.reading_start or 0.0), 0.0)
+            else:
+                rec.units = 1.0
+
+    @api.onchange('type_id')
+    def _onchange_type(self):
+        for rec in self:
+            if rec.type_id:
+                rec.unit_rate = rec.type_id.unit_rate
+                # default amount guess
+                if rec.type_id.pricing == 'fixed':
+                    rec.amount = rec.type_id.unit_rate
+                elif rec.type_id.pricing == 'meter':
+                    rec.amount = rec.units * (rec.unit_rate or 0.0)
+
+    @api.onchange('units', 'unit_rate', 'type_id')
+    def _onchange_amount_from_units(self):
+        for rec in self:
+            if rec.type_id and rec.type_id.pricing == 'meter':
+                rec.amount = (rec.units or 0.0) * (rec.unit_rate or 0.0)
+
+    @api.depends('invoice_id.payment_state')
+    def _compute_state(self):
+        for rec in self:
+            if not rec.invoice_id:
+                rec.state = 'draft'
+            else:
+                if rec.invoice_id.payment_state == 'paid':
+                    rec.state = 'paid'
+                else:
+                    rec.state = 'billed'
+
+
+
+
+class RentContract(models.Model):
+    _inherit = 'rent.contract'
+
+    def _bill_utilities(self, period_start, period_end, lines):
+        """Add utility charges to the draft invoices of many contracts at once.
+
+        :param lines: iterable of ``(contract, vals)``; ``vals`` holds ``type`` (rent.utility.type),
+            ``reading_start``, ``reading_end``, ``units``, ``unit_rate``, ``amount`` and ``notes``
+        :return: the invoices that received lines
+
+        Draft invoices are looked up with one search and the missing ones created with one create();
+        all invoice lines, all expenses and the prepayment allocation are then done in one call each.
+        """
+        lines = list(lines)
+        contracts = self.browse(list(dict.fromkeys(c.id for c, _vals in lines)))
+        if not contracts:
+            return self.env['account.move']
+        Move = self.env['account.move']
+
+        partners = {c.id: c._get_tenant_partner() for c in contracts}
+        invoices = {}
+        # only rent/utility drafts: a draft prepayment invoice of the contract must not receive charges
+        for move in Move.search([
+            ('move_type', '=', 'out_invoice'),
+            ('state', '=', 'draft'),
+            ('contract_id', 'in', contracts.ids),
+            ('rent_kind', 'in', ('rent', 'utility')),
+        ]):
+            if move.partner_id == partners[move.contract_id.id]:
+                invoices.setdefault(move.contract_id.id, move)
+
+        missing = contracts.filtered(lambda c: c.id not in invoices)
+        today = fields.Date.context_today(self)
+        new_moves = Move.create([{
+            'move_type': 'out_invoice',
+            'partner_id': partners[c.id].id,
+            'invoice_origin': c.name,
+            'invoice_date': today,
+            'company_id': c.company_id.id,
+            'currency_id': c.currency_id.id,
+            'contract_id': c.id,
+            'rent_kind': 'utility',
+            'x_building_id': c.building_id.id,
+            'x_unit_id': c.unit_id.id,
+            'x_floor': c.unit_id.floor,
+            'x_unit_number': c.unit_id.unit_number,
+            'x_owner_id': c.owner_id.id,
+        } for c in missing])
+        invoices.update(zip(missing.ids, new_moves))
+
+        aml_vals_list = []
+        for contract, vals in lines:
+            utype = vals['type']
+            if vals['amount'] <= 0:
+                raise UserError(_("Amount for line '%s' must be > 0.") % (utype.name,))
+            aml_vals_list.append({
+                'move_id': invoices[contract.id].id,
+                'product_id': utype.product_id.id,
+                'name': "%s (%s → %s)" % (utype.name, period_start or '', period_end or ''),
+                'quantity': (vals['units'] if utype.pricing == 'meter' else 1.0) or 1.0,
+                'price_unit': (vals['unit_rate'] if utype.pricing == 'meter' else vals['amount']),
+            })
+        # one create for every invoice: taxes and payment terms are re-synced once per move
+        aml_lines = self.env['account.move.line'].with_context(check_move_validity=False).create(aml_vals_list)
+
+        self.env['rent.utility.expense'].create([{
+            'name': aml.name,
+            'contract_id': contract.id,
+            'type_id': vals['type'].id,
+            'period_start': period_start,
+            'period_end': period_end,
+            'reading_start': vals.get('reading_start'),
+            'reading_end': vals.get('reading_end'),
+            'units': vals['units'],
+            'unit_rate': vals['unit_rate'],
+            'amount': vals['amount'] if vals['type'].pricing == 'fixed' else (vals['units'] * vals['unit_rate']),
+            'currency_id': aml.move_id.currency_id.id,
+            'invoice_id': aml.move_id.id,
+            'move_line_id': aml.id,
+            'notes': vals.get('notes'),
+        } for (contract, vals), aml in zip(lines, aml_lines)])
+
+        contracts._apply_prepayment_to_invoices(invoices)
+        return Move.union(*invoices.values())
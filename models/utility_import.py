@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+import base64
+import csv
+import io
+import itertools
+import logging
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+_logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = ('building', 'unit', 'type', 'reading_end', 'reading_start', 'unit_rate')
+REQUIRED_COLUMNS = ('building', 'unit', 'type', 'reading_end')
+
+
+class RentUtilityImport(models.Model):
+    """Monthly meter-reading file (CSV / XLSX), billed in the background.
+
+    The file is read row by row and handled in batches of ``estate_rent_mgmt.cron_batch_size``
+    rows; ``rows_done`` is committed with every batch so an interrupted import resumes where it
+    stopped instead of billing the same readings twice."""
+    _name = 'rent.utility.import'
+    _description = 'Utility Meter Reading Import'
+    _order = 'id desc'
+
+    name = fields.Char(required=True, default=lambda s: _('Meter Readings'))
+    file = fields.Binary(string='File (CSV / XLSX)', required=True, attachment=True)
+    filename = fields.Char()
+    period_start = fields.Date(required=True)
+    period_end = fields.Date(required=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('queued', 'Queued'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], default='draft', required=True, readonly=True)
+    rows_done = fields.Integer(string='Rows Processed', readonly=True,
+                               help="Checkpoint: data rows already handled (billed or rejected).")
+    rows_billed = fields.Integer(readonly=True)
+    error_ids = fields.One2many('rent.utility.import.error', 'import_id', string='Rejected Rows', readonly=True)
+    error_count = fields.Integer(compute='_compute_error_count')
+    message = fields.Text(readonly=True)
+
+    @api.depends('error_ids')
+    def _compute_error_count(self):
+        counts = dict(self.env['rent.utility.import.error']._read_group(
+            [('import_id', 'in', self.ids)], ['import_id'], ['__count'],
+        ))
+        for rec in self:
+            rec.error_count = counts.get(rec, 0)
+
+    def action_queue(self):
+        for rec in self:
+            if rec.period_end < rec.period_start:
+                raise UserError(_("The period end must be after its start."))
+        self.write({'state': 'queued', 'message': False})
+        self.env.ref('estate_rent_mgmt.cron_process_utility_imports')._trigger()
+
+    def action_reset(self):
+        """Restart a failed import from its last checkpoint."""
+        self.filtered(lambda r: r.state == 'failed').write({'state': 'queued', 'message': False})
+
+    # ---------------------------------------------------------------- reading
+    def _open_file(self):
+        """Binary stream of the uploaded file; read from the filestore when possible so that
+        the file is never decoded in memory as a whole."""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name), ('res_field', '=', 'file'), ('res_id', '=', self.id),
+        ], limit=1)
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(base64.b64decode(self.with_context(bin_size=False).file or b''))
+
+    def _iter_raw_rows(self, stream):
+        if (self.filename or '').lower().endswith('.xlsx'):
+            if openpyxl is None:
+                raise UserError(_("Reading XLSX files requires the Python library openpyxl."))
+            workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+            try:
+                yield from workbook.active.iter_rows(values_only=True)
+            finally:
+                workbook.close()
+        else:
+            yield from csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+
+    def _iter_rows(self):
+        """Yield ``(row_number, row_dict)`` for every data row (row_number starts at 1 after the header)."""
+        with self._open_file() as stream:
+            rows = self._iter_raw_rows(stream)
+            header = [str(h or '').strip().lower() for h in next(rows, ())]
+            missing = [col for col in REQUIRED_COLUMNS if col not in header]
+            if missing:
+                raise UserError(_("Missing column(s) in the file: %s") % ', '.join(missing))
+            index = {col: header.index(col) for col in IMPORT_COLUMNS if col in header}
+            for row_number, row in enumerate(rows, start=1):
+                if not any(cell not in (None, '') for cell in row):
+                    continue
+                yield row_number, {
+                    col: (row[i] if i < len(row) else None) for col, i in index.items()
+                }
+
+    # ------------------------------------------------------------- processing
+    @api.model
+    def cron_process_utility_imports(self):
+        for imp in self.search([('state', '=', 'queued')], order='id'):
+            imp._process()
+
+    def _process(self):
+        self.ensure_one()
+        Contract = self.env['rent.contract']
+        auto_commit = Contract._cron_auto_commit()
+        batch_size = Contract._get_cron_batch_size()
+        try:
+            checkpoint = self.rows_done
+            rows = (item for item in self._iter_rows() if item[0] > checkpoint)
+            for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+                with self.env.cr.savepoint():
+                    billed = self._process_batch(batch)
+                    self.write({
+                        'rows_done': batch[-1][0],
+                        'rows_billed': self.rows_billed + billed,
+                    })
+                if auto_commit:
+                    self.env.cr.commit()
+                # keep memory bounded on large files
+                self.env.invalidate_all()
+        except Exception as e:  # noqa: BLE001 - the error is kept on the import for the user
+            # the failed batch was rolled back to its savepoint: drop the records it left in the
+            # cache (draft invoices, meters, contract lookups) so neither the failure write nor the
+            # next imports of this cron run reuse them
+            self.env.transaction.clear()
+            _logger.exception("Utility import %s failed at row %s", self.id, self.rows_done)
+            self.write({'state': 'failed', 'message': str(e)})
+        else:
+            self.write({'state': 'done'})
+        if auto_commit:
+            self.env.cr.commit()
+
+    def _to_float(self, value):
+        if value in (None, ''):
+            return None
+        return float(str(value).replace(',', '').strip()) if isinstance(value, str) else float(value)
+
+    def _process_batch(self, batch):
+        """Validate and bill one batch of ``(row_number, row)``; returns the number of billed rows."""
+        buildings, units, types = self._resolve_batch(batch)
+        errors = []
+        parsed = []
+        for row_number, row in batch:
+            building = buildings.get(str(row.get('building') or '').strip())
+            unit = building and units.get((building.id, str(row.get('unit') or '').strip()))
+            utype = types.get(str(row.get('type') or '').strip())
+            contract = unit and unit.active_contract_id
+            try:
+                reading_end = self._to_float(row.get('reading_end'))
+                reading_start = self._to_float(row.get('reading_start'))
+                unit_rate = self._to_float(row.get('unit_rate'))
+            except ValueError:
+                errors.append((row_number, _("Readings and rate must be numbers.")))
+                continue
+            if not building:
+                errors.append((row_number, _("Unknown building '%s'.") % row.get('building')))
+            elif not unit:
+                errors.append((row_number, _("Unknown unit '%s'.") % row.get('unit')))
+            elif not utype:
+                errors.append((row_number, _("Unknown utility type '%s'.") % row.get('type')))
+            elif not contract:
+                errors.append((row_number, _("Unit '%s' has no active contract.") % unit.display_name))
+            elif utype.pricing == 'meter' and reading_end is None:
+                errors.append((row_number, _("Missing end reading.")))
+            else:
+                parsed.append((row_number, contract, utype, reading_start, reading_end, unit_rate))
+
+        # previous reading of every (contract, type) of the batch, one query
+        previous = self._get_last_readings({(c.id, t.id) for _n, c, t, *_rest in parsed})
+        lines = []
+        for row_number, contract, utype, reading_start, reading_end, unit_rate in parsed:
+            key = (contract.id, utype.id)
+            if unit_rate is None:
+                unit_rate = utype.unit_rate
+            if utype.pricing == 'meter':
+                if reading_start is None:
+                    reading_start = previous.get(key, 0.0)
+                units = reading_end - reading_start
+                if units < 0:
+                    errors.append((row_number, _("Negative consumption: %(end)s is below the previous reading %(start)s.",
+                                                 end=reading_end, start=reading_start)))
+                    continue
+                if utype.max_units_per_period and units > utype.max_units_per_period:
+                    errors.append((row_number, _("Implausible consumption of %(units)s (limit %(max)s).",
+                                                 units=units, max=utype.max_units_per_period)))
+                    continue
+                amount = units * unit_rate
+                # a later row of the same file continues from this reading
+                previous[key] = reading_end
+            else:
+                units = 1.0
+                amount = unit_rate
+            if amount <= 0:
+                errors.append((row_number, _("Amount must be > 0.")))
+                continue
+            lines.append((contract, {
+                'type': utype,
+                'reading_start': reading_start,
+                'reading_end': reading_end,
+                'units': units,
+                'unit_rate': unit_rate,
+                'amount': amount,
+                'notes': self.name,
+            }))
+
+        if lines:
+            self.env['rent.contract']._bill_utilities(self.period_start, self.period_end, lines)
+        if errors:
+            self.env['rent.utility.import.error'].create([
+                {'import_id': self.id, 'row_number': n, 'message': msg} for n, msg in errors
+            ])
+        return len(lines)
+
+    def _resolve_batch(self, batch):
+        """Buildings (by code or name), units (by number or name) and utility types of a batch, one search each."""
+        building_keys = {str(row.get('building') or '').strip() for _n, row in batch}
+        buildings = {}
+        for building in self.env['estate.building'].search(
+            ['|', ('code', 'in', list(building_keys)), ('name', 'in', list(building_keys))]
+        ):
+            buildings.setdefault(building.name, building)
+            if building.code:
+                buildings[building.code] = building
+
+        unit_keys = list({str(row.get('unit') or '').strip() for _n, row in batch})
+        units = {}
+        building_ids = list({b.id for b in buildings.values()})
+        for unit in self.env['estate.building.unit'].search([
+            ('building_id', 'in', building_ids),
+            '|', ('unit_number', 'in', unit_keys), ('name', 'in', unit_keys),
+        ]):
+            units.setdefault((unit.building_id.id, unit.name), unit)
+            if unit.unit_number:
+                units[(unit.building_id.id, unit.unit_number)] = unit
+
+        type_keys = list({str(row.get('type') or '').strip() for _n, row in batch})
+        types = {t.name: t for t in self.env['rent.utility.type'].search([('name', 'in', type_keys)])}
+        return buildings, units, types
+
+    def _get_last_readings(self, keys):
+        """Latest ``reading_end`` per (contract_id, type_id)."""
+        if not keys:
+            return {}
+        self.env['rent.utility.expense'].flush_model(['contract_id', 'type_id', 'period_end', 'reading_end'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (contract_id, type_id) contract_id, type_id, reading_end
+              FROM rent_utility_expense
+             WHERE contract_id = ANY(%s) AND type_id = ANY(%s)
+             ORDER BY contract_id, type_id, period_end DESC, id DESC
+        """, [list({c for c, _t in keys}), list({t for _c, t in keys})])
+        return {(c, t): reading or 0.0 for c, t, reading in self.env.cr.fetchall() if (c, t) in keys}
+
+
+class RentUtilityImportError(models.Model):
+    _name = 'rent.utility.import.error'
+    _description = 'Utility Import - Rejected Row'
+    _order = 'import_id, row_number'
+
+    import_id = fields.Many2one('rent.utility.import', required=True, ondelete='cascade', index=True)
+    row_number = fields.Integer(string='Row')
+    message = fields.Char(required=True)
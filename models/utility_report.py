@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+
+
+class RentUtilityReport(models.Model):
+    """Monthly utility consumption per building, unit and utility type.
+
+    Backed by a SQL view, or by a materialized view refreshed by cron when the system
+    parameter ``estate_rent_mgmt.utility_report_materialized`` is set (large histories)."""
+    _name = 'rent.utility.report'
+    _description = 'Utility Consumption Analysis'
+    _auto = False
+    _order = 'month desc'
+
+    month = fields.Date(string='Month', readonly=True)
+    building_id = fields.Many2one('estate.building', string='البناية', readonly=True)
+    unit_id = fields.Many2one('estate.building.unit', string='الوحدة/الشقة', readonly=True)
+    owner_id = fields.Many2one('res.partner', string='Owner / المالك', readonly=True)
+    type_id = fields.Many2one('rent.utility.type', string='Utility Type', readonly=True)
+    company_id = fields.Many2one('res.company', string='الشركة', readonly=True)
+    currency_id = fields.Many2one('res.currency', readonly=True)
+    units = fields.Float(string='Units', readonly=True)
+    amount = fields.Monetary(string='Amount', currency_field='currency_id', readonly=True)
+    expense_count = fields.Integer(string='Readings', readonly=True)
+
+    def _query(self):
+        return """
+            SELECT MIN(e.id) AS id,
+                   date_trunc('month', e.period_start)::date AS month,
+                   c.building_id,
+                   c.unit_id,
+                   c.owner_id,
+                   e.type_id,
+                   c.company_id,
+                   e.currency_id,
+                   SUM(e.units) AS units,
+                   SUM(e.amount) AS amount,
+                   COUNT(*) AS expense_count
+              FROM rent_utility_expense e
+              JOIN rent_contract c ON c.id = e.contract_id
+          GROUP BY date_trunc('month', e.period_start), c.building_id, c.unit_id, c.owner_id,
+                   e.type_id, c.company_id, e.currency_id
+        """
+
+    @api.model
+    def _use_materialized(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param('estate_rent_mgmt.utility_report_materialized'))
+
+    def _relkind(self):
+        """'v' (view), 'm' (materialized view) or None."""
+        self.env.cr.execute("SELECT relkind FROM pg_class WHERE relname = %s", [self._table])
+        row = self.env.cr.fetchone()
+        return row and row[0]
+
+    def _create_view(self):
+        cr = self.env.cr
+        relkind = self._relkind()
+        if relkind == 'm':
+            cr.execute(f'DROP MATERIALIZED VIEW IF EXISTS "{self._table}" CASCADE')
+        elif relkind == 'v':
+            cr.execute(f'DROP VIEW IF EXISTS "{self._table}" CASCADE')
+        if self._use_materialized():
+            cr.execute(f'CREATE MATERIALIZED VIEW "{self._table}" AS ({self._query()})')
+            # required by REFRESH ... CONCURRENTLY, and used by the ORM to read rows back
+            cr.execute(f'CREATE UNIQUE INDEX "{self._table}_id_idx" ON "{self._table}" (id)')
+            cr.execute(f'CREATE INDEX "{self._table}_month_idx" ON "{self._table}" (month, building_id)')
+        else:
+            cr.execute(f'CREATE VIEW "{self._table}" AS ({self._query()})')
+
+    def init(self):
+        self._create_view()
+
+    @api.model
+    def cron_refresh_utility_report(self):
+        """Refresh the materialized view (without blocking readers), or switch between a plain and a
+        materialized view after the system parameter was changed."""
+        materialized = self._use_materialized()
+        if materialized and self._relkind() == 'm':
+            self.env.cr.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY "{self._table}"')
+        elif materialized or self._relkind() != 'v':
+            self._create_view()
+        self.invalidate_model()
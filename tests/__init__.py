@@ -0,0 +1,2 @@
+from . import test_rent_hot_paths
+from . import test_utility_billing
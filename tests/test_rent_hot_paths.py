@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.estate_rent_mgmt.benchmarks.bench_rent_hot_paths import MARGINS, _operations
+from odoo.addons.estate_rent_mgmt.benchmarks.explain_rent_lookups import _module_indexes
+from odoo.addons.estate_rent_mgmt.benchmarks.seed_portfolio import seed
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestRentHotPaths(AccountTestInvoicingCommon):
+    """The operations of benchmarks/bench_rent_hot_paths.py on a small seeded portfolio: a GROWTH
+    times bigger sample may only issue a few more queries (MARGINS), not one more per record."""
+
+    SAMPLE = 5
+    GROWTH = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ICP = cls.env['ir.config_parameter'].sudo()
+        ICP.set_param('estate_rent_mgmt.cron_shard_count', 1)
+        ICP.set_param('estate_rent_mgmt.cron_batch_size', cls.SAMPLE * cls.GROWTH)
+        cls.today = fields.Date.context_today(cls.env['rent.contract'])
+        cls.data = seed(cls.env, buildings=10, units=400, prepayments=400, consumptions=2, expenses=2)
+
+    def _count_queries(self, operation):
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries = self.cr.sql_log_count
+        operation()
+        self.env.flush_all()
+        return self.cr.sql_log_count - queries
+
+    def test_query_counts_do_not_grow(self):
+        for label, prepare in _operations(self.env, self.data, self.today, self.SAMPLE):
+            with self.subTest(operation=label):
+                operation, _size = prepare(self.SAMPLE)
+                small = self._count_queries(operation)
+                operation, _size = prepare(self.SAMPLE * self.GROWTH)
+                self.env.invalidate_all()
+                with self.assertQueryCount(small + MARGINS[label]):
+                    operation()
+
+    def test_rent_indexes_exist(self):
+        """The lookup plans of benchmarks/explain_rent_lookups.py rely on these indexes."""
+        names = _module_indexes(self.env)
+        self.env.cr.execute("SELECT indexname FROM pg_indexes WHERE indexname IN %s", [tuple(names)])
+        self.assertEqual(set(names) - {row[0] for row in self.env.cr.fetchall()}, set())
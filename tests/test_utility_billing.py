@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from dateutil.relativedelta import relativedelta
+
+from odoo import fields
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestUtilityBilling(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.today = fields.Date.context_today(cls.env['rent.contract'])
+        building = cls.env['estate.building'].create({'name': 'Utility Building'})
+        unit = cls.env['estate.building.unit'].create({'name': 'U1', 'building_id': building.id})
+        cls.contract = cls.env['rent.contract'].create({
+            'partner_id': cls.partner_a.id,
+            'building_id': building.id,
+            'unit_id': unit.id,
+            'amount': 500.0,
+            'start_date': cls.today - relativedelta(months=2),
+            'state': 'active',
+        })
+        product = cls.env['product.product'].create({'name': 'Water', 'type': 'service'})
+        cls.water = cls.env['rent.utility.type'].create({'name': 'Water', 'product_id': product.id, 'pricing': 'fixed'})
+
+    def test_draft_prepayment_invoice_not_reused(self):
+        self.contract.action_create_prepayment_invoice()
+        prepayment_move = self.contract.prepayment_ids.move_id
+        self.assertEqual(prepayment_move.rent_kind, 'prepayment')
+        self.assertEqual(prepayment_move.state, 'draft')
+
+        invoices = self.contract._bill_utilities(self.today - relativedelta(months=1), self.today, [(self.contract, {
+            'type': self.water,
+            'reading_start': 0.0,
+            'reading_end': 0.0,
+            'units': 0.0,
+            'unit_rate': 0.0,
+            'amount': 40.0,
+            'notes': False,
+        })])
+
+        self.assertNotIn(prepayment_move, invoices)
+        self.assertEqual(invoices.rent_kind, 'utility')
+        self.assertEqual(len(prepayment_move.invoice_line_ids), 1)
+        self.assertFalse(self.env['rent.prepayment.consumption'].search([('invoice_id', '=', prepayment_move.id)]))